@@ -1,8 +1,8 @@
 from flask import Flask
-from sqlalchemy import text
+from sqlalchemy import event, text
 import os
 
-from models import db, User, CERecord, UserDesignation, Feedback, AuditLog, PendingCERecord
+from models import db, User, CERecord, UserDesignation, Feedback, AuditLog, PendingCERecord, PasswordReset
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -17,9 +17,36 @@ else:
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ce_tracker.db'
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Hard cap on request bodies; covers the 20MB AI extraction upload plus multipart overhead
+app.config['MAX_CONTENT_LENGTH'] = 25 * 1024 * 1024
 
 db.init_app(app)
 
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Relax fsyncs to NORMAL and give SQLite a memory-mapped file, in-memory temp tables and a 64MB page cache."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-65536')
+    cursor.close()
+
+
+def _set_sqlite_wal(dbapi_connection, connection_record):
+    """WAL lets readers run alongside a writer, and NORMAL sync is durable enough in WAL mode."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+        # In-memory databases have no journal file to switch over
+        if db.engine.url.database not in (None, '', ':memory:') and db.engine.url.query.get('mode') != 'memory':
+            event.listen(db.engine, 'connect', _set_sqlite_wal)
+
 # Register blueprints
 from blueprints.auth import auth_bp
 from blueprints.ce_records import ce_bp
@@ -64,8 +91,6 @@ def update_database_schema():
         columns_to_add = [
             ('users', 'is_napfa_member', f'BOOLEAN DEFAULT {boolean_default} NOT NULL'),
             ('users', 'napfa_join_date', 'DATE'),
-            ('users', 'reset_token', 'VARCHAR(100)'),
-            ('users', 'reset_token_expiry', 'TIMESTAMP' if is_postgresql else 'DATETIME'),
             ('user_designation', 'birth_month', 'INTEGER'),
             ('user_designation', 'state', 'VARCHAR(2)'),
             ('ce_record', 'is_napfa_approved', f'BOOLEAN DEFAULT {boolean_default} NOT NULL'),
@@ -75,6 +100,7 @@ def update_database_schema():
             ('users', 'is_active', f'BOOLEAN DEFAULT TRUE NOT NULL' if is_postgresql else f'BOOLEAN DEFAULT 1 NOT NULL'),
             ('user_designation', 'last_reminder_sent', 'TIMESTAMP' if is_postgresql else 'DATETIME'),
             ('user_designation', 'custom_period_end', 'DATE'),
+            ('ce_record', 'updated_at', 'TIMESTAMP' if is_postgresql else 'DATETIME'),
         ]
 
         for table, column, col_type in columns_to_add:
@@ -90,6 +116,40 @@ def update_database_schema():
                 except Exception:
                     db.session.rollback()
 
+        # created_at is filled in by the database; tables created before that need the default added
+        for table in ('users', 'ce_record', 'user_designation', 'feedback', 'pending_ce_record', 'password_resets'):
+            try:
+                if is_postgresql:
+                    db.session.execute(text(f'ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP'))
+                else:
+                    # SQLite can't change a column default in place, so fill it in after insert instead
+                    columns = db.session.execute(text(f'PRAGMA table_info({table})')).all()
+                    if any(col.name == 'created_at' and col.dflt_value is None for col in columns):
+                        db.session.execute(text(
+                            f'CREATE TRIGGER IF NOT EXISTS {table}_created_at_default AFTER INSERT ON {table} '
+                            f'FOR EACH ROW WHEN NEW.created_at IS NULL BEGIN '
+                            f'UPDATE {table} SET created_at = CURRENT_TIMESTAMP WHERE rowid = NEW.rowid; END'
+                        ))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error setting created_at default on {table}: {e}")
+
+        # create_all() only builds indexes for brand-new tables; add any missing ones to existing tables
+        for index in CERecord.__table__.indexes | Feedback.__table__.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                print(f"Error creating index {index.name}: {e}")
+
+        # Superseded by ix_cerecord_user_date_covering
+        try:
+            db.session.execute(text('DROP INDEX IF EXISTS ix_cerecord_user_date'))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error dropping index ix_cerecord_user_date: {e}")
+
         print("Database schema is up to date.")
 
 
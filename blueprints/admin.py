@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+import hmac
 import os
 from datetime import datetime, timedelta, timezone
 from functools import wraps
@@ -6,6 +7,7 @@ from functools import wraps
 from sqlalchemy import func
 
 from models import db, User, CERecord, UserDesignation, Feedback, AuditLog
+from blueprints.ce_records import purge_cached_pdfs
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -18,7 +20,7 @@ def admin_required(f):
         admin_key = request.args.get('key', '')
         expected_key = os.environ.get('ADMIN_KEY', 'cetracker2025admin')
 
-        if admin_key == expected_key:
+        if hmac.compare_digest(admin_key.encode(), expected_key.encode()):
             return f(*args, **kwargs)
 
         if 'user_id' in session:
@@ -59,8 +61,11 @@ def view_feedback():
         query = query.filter(Feedback.is_read == True)
 
     feedback_list = query.order_by(Feedback.created_at.desc()).all()
-    total_count = Feedback.query.count()
-    unread_count = Feedback.query.filter(Feedback.is_read == False).count()
+    # Both header counts in one pass over the table
+    total_count, unread_count = db.session.query(
+        func.count(Feedback.id),
+        func.count(Feedback.id).filter(Feedback.is_read == False),
+    ).one()
 
     admin_key = request.args.get('key', '')
 
@@ -100,11 +105,12 @@ def delete_feedback(feedback_id):
 @admin_required
 def admin_dashboard():
     # Overall stats
-    total_users = User.query.count()
-    total_records = CERecord.query.count()
+    # Plain COUNTs; Query.count() would wrap each one in a SELECT * subquery
+    total_users = db.session.query(func.count(User.id)).scalar()
+    total_records = db.session.query(func.count(CERecord.id)).scalar()
     total_hours = db.session.query(func.coalesce(func.sum(CERecord.hours), 0)).scalar()
     thirty_days_ago = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=30)
-    new_users_30d = User.query.filter(User.created_at >= thirty_days_ago).count()
+    new_users_30d = db.session.query(func.count(User.id)).filter(User.created_at >= thirty_days_ago).scalar()
 
     # Top 5 most active users by CE record count
     top_users = (
@@ -227,6 +233,7 @@ def delete_user(user_id):
     Feedback.query.filter_by(user_id=user_id).delete()
     db.session.delete(target_user)
     db.session.commit()
+    purge_cached_pdfs(user_id)
 
     flash(f'User {username} and all associated data have been deleted.', 'success')
     return redirect(url_for('admin.admin_dashboard'))
@@ -1,15 +1,37 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta, timezone
-import uuid
+import hashlib
+import secrets
 
-from models import db, User, UserDesignation
-from designation_helpers import DESIGNATION_REQUIREMENTS, ALLOWED_DESIGNATIONS
+from sqlalchemy import bindparam, select
+
+from models import db, User, UserDesignation, PasswordReset
+from designation_helpers import DESIGNATION_REQUIREMENTS, ALLOWED_DESIGNATIONS, US_STATES
 from email_helper import send_email
 from email_templates import password_reset_email, welcome_email
+from security import hash_password, verify_password, needs_rehash
 
 auth_bp = Blueprint('auth', __name__)
 
+# Built once at import; SQLAlchemy's statement cache reuses the compiled SQL on every login
+_SELECT_USER_BY_USERNAME = select(User).where(User.username == bindparam('username'))
+
+
+def _hash_reset_token(token: str) -> str:
+    """Reset tokens are stored as SHA-256 digests so a leaked table can't be replayed."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _validate_password(password: str, confirm_password: str) -> str | None:
+    """Return the first validation error for a new password, or None if it is acceptable."""
+    if not password:
+        return 'Password is required.'
+    if len(password) < 6:
+        return 'Password must be at least 6 characters long.'
+    if password != confirm_password:
+        return 'Passwords do not match.'
+    return None
+
 
 @auth_bp.route('/')
 def index():
@@ -24,15 +46,16 @@ def register():
         return redirect(url_for('ce_records.dashboard'))
 
     if request.method == 'POST':
-        username = request.form.get('username', '').strip()
-        email = request.form.get('email', '').strip()
-        password = request.form.get('password', '')
-        confirm_password = request.form.get('confirm_password', '')
-        designations = request.form.getlist('designations')
-        cfp_birth_month = request.form.get('cfp_birth_month', '')
-        cpa_state = request.form.get('cpa_state', '')
-        is_napfa_member = request.form.get('is_napfa_member') == 'on'
-        napfa_join_date = request.form.get('napfa_join_date', '')
+        form = request.form
+        username = form.get('username', '').strip()
+        email = form.get('email', '').strip()
+        password = form.get('password', '')
+        confirm_password = form.get('confirm_password', '')
+        designations = form.getlist('designations')
+        cfp_birth_month = form.get('cfp_birth_month', '')
+        cpa_state = form.get('cpa_state', '')
+        is_napfa_member = form.get('is_napfa_member') == 'on'
+        napfa_join_date = form.get('napfa_join_date', '')
 
         form_data = {
             'username': username, 'email': email, 'designations': designations,
@@ -40,7 +63,7 @@ def register():
             'is_napfa_member': is_napfa_member, 'napfa_join_date': napfa_join_date
         }
 
-        disclaimer_ack = request.form.get('disclaimer_ack')
+        disclaimer_ack = form.get('disclaimer_ack')
 
         errors = []
         if not disclaimer_ack:
@@ -49,12 +72,9 @@ def register():
             errors.append('Username is required.')
         if not email:
             errors.append('Email is required.')
-        if not password:
-            errors.append('Password is required.')
-        elif len(password) < 6:
-            errors.append('Password must be at least 6 characters long.')
-        if password and confirm_password and password != confirm_password:
-            errors.append('Passwords do not match.')
+        password_error = _validate_password(password, confirm_password)
+        if password_error:
+            errors.append(password_error)
 
         if 'CFP' in designations:
             if not cfp_birth_month:
@@ -70,7 +90,7 @@ def register():
         if 'CPA' in designations:
             if not cpa_state:
                 errors.append('State is required for CPA designation.')
-            elif len(cpa_state) != 2 or not cpa_state.isalpha():
+            elif cpa_state.upper() not in US_STATES:
                 errors.append('Invalid state abbreviation. Please use a 2-letter state code (e.g., CA, NY, TX).')
 
         napfa_join_date_obj = None
@@ -83,42 +103,38 @@ def register():
                 except ValueError:
                     errors.append('Invalid NAPFA join date format.')
 
-        if errors:
-            for error in errors:
-                flash(error, 'error')
-            return render_template('register.html',
-                                   designation_requirements=DESIGNATION_REQUIREMENTS,
-                                   form_data=form_data)
-
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists.', 'error')
-            return render_template('register.html',
-                                   designation_requirements=DESIGNATION_REQUIREMENTS,
-                                   form_data=form_data)
+        if not errors and db.session.scalar(_SELECT_USER_BY_USERNAME, {'username': username}):
+            errors.append('Username already exists.')
+        elif not errors and User.query.filter_by(email=email).first():
+            errors.append('Email already exists.')
 
-        if User.query.filter_by(email=email).first():
-            flash('Email already exists.', 'error')
+        if errors:
+            # Rendered directly by register.html rather than queued through flash()
             return render_template('register.html',
                                    designation_requirements=DESIGNATION_REQUIREMENTS,
-                                   form_data=form_data)
+                                   form_data=form_data,
+                                   errors=errors)
 
         user = User(
             username=username, email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=hash_password(password),
             is_napfa_member=is_napfa_member,
             napfa_join_date=napfa_join_date_obj
         )
         db.session.add(user)
         db.session.flush()
 
+        birth_month = int(cfp_birth_month) if 'CFP' in designations else None
+        state = cpa_state.upper() if 'CPA' in designations else None
         for designation in designations:
-            if designation in ALLOWED_DESIGNATIONS:
-                ud = UserDesignation(
-                    user_id=user.id, designation=designation,
-                    birth_month=int(cfp_birth_month) if designation == 'CFP' and cfp_birth_month else None,
-                    state=cpa_state.upper() if designation == 'CPA' and cpa_state else None
-                )
-                db.session.add(ud)
+            if designation not in ALLOWED_DESIGNATIONS:
+                continue
+            ud = UserDesignation(
+                user_id=user.id, designation=designation,
+                birth_month=birth_month if designation == 'CFP' else None,
+                state=state if designation == 'CPA' else None
+            )
+            db.session.add(ud)
 
         db.session.commit()
 
@@ -150,7 +166,7 @@ def login():
             return render_template('login.html')
 
         try:
-            user = User.query.filter_by(username=username).first()
+            user = db.session.scalar(_SELECT_USER_BY_USERNAME, {'username': username})
             if not user:
                 flash('User not found. Please check your username or register for a new account.', 'error')
                 return render_template('login.html')
@@ -159,7 +175,11 @@ def login():
                 flash('This account has been deactivated. Contact an administrator.', 'error')
                 return render_template('login.html')
 
-            if check_password_hash(user.password_hash, password):
+            if verify_password(user.password_hash, password):
+                if needs_rehash(user.password_hash):
+                    # Upgrade hashes made with an older method now that we have the plaintext
+                    user.password_hash = hash_password(password)
+                    db.session.commit()
                 session['user_id'] = user.id
                 session['username'] = user.username
                 session['show_napfa_tracking'] = user.is_napfa_member
@@ -196,9 +216,17 @@ def forgot_password():
 
         user = User.query.filter_by(email=email).first()
         if user:
-            token = uuid.uuid4().hex
-            user.reset_token = token
-            user.reset_token_expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            token = secrets.token_urlsafe(24)
+            # Supersede this user's outstanding links and sweep anyone's expired ones
+            PasswordReset.query.filter(
+                (PasswordReset.user_id == user.id) | (PasswordReset.expires_at < now)
+            ).delete(synchronize_session=False)
+            db.session.add(PasswordReset(
+                user_id=user.id,
+                token_hash=_hash_reset_token(token),
+                expires_at=now + timedelta(hours=1)
+            ))
             db.session.commit()
 
             reset_url = request.host_url.rstrip('/') + url_for('auth.reset_password', token=token)
@@ -221,9 +249,13 @@ def forgot_password():
 
 @auth_bp.route('/reset_password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
-    user = User.query.filter_by(reset_token=token).first()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    reset = PasswordReset.query.filter(
+        PasswordReset.token_hash == _hash_reset_token(token),
+        PasswordReset.expires_at >= now
+    ).first()
 
-    if not user or not user.reset_token_expiry or user.reset_token_expiry < datetime.now(timezone.utc).replace(tzinfo=None):
+    if not reset:
         flash('This reset link is invalid or has expired.', 'error')
         return redirect(url_for('auth.forgot_password'))
 
@@ -231,19 +263,13 @@ def reset_password(token):
         new_password = request.form.get('new_password', '')
         confirm_password = request.form.get('confirm_password', '')
 
-        if not new_password:
-            flash('New password is required.', 'error')
-            return render_template('reset_password.html', token=token)
-        if len(new_password) < 6:
-            flash('Password must be at least 6 characters long.', 'error')
-            return render_template('reset_password.html', token=token)
-        if new_password != confirm_password:
-            flash('Passwords do not match.', 'error')
+        password_error = _validate_password(new_password, confirm_password)
+        if password_error:
+            flash(password_error, 'error')
             return render_template('reset_password.html', token=token)
 
-        user.password_hash = generate_password_hash(new_password)
-        user.reset_token = None
-        user.reset_token_expiry = None
+        reset.user.password_hash = hash_password(new_password)
+        PasswordReset.query.filter_by(user_id=reset.user_id).delete()
         db.session.commit()
 
         flash('Your password has been reset! Please log in.', 'success')
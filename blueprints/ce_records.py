@@ -1,29 +1,70 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, Response, current_app, jsonify
-from datetime import datetime, timedelta, timezone
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, Response, current_app, jsonify, stream_with_context, abort
+from datetime import date, datetime, timezone
+from collections import defaultdict
+from functools import lru_cache
 import csv
+import hashlib
 import io
 import json
+import os
+import tempfile
+import time
+
+import orjson
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import extract, func, insert, select
+from sqlalchemy.orm import joinedload, load_only
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 
-from models import db, User, CERecord, UserDesignation, PendingCERecord
+from models import db, User, CERecord, PendingCERecord
 from designation_helpers import calculate_designation_requirements, calculate_napfa_requirements
 
 ce_bp = Blueprint('ce_records', __name__)
 
+# Routes whose login prompt is more specific than the default
+_LOGIN_MESSAGES = {
+    'ce_records.dashboard': 'Please log in to access your dashboard.',
+    'ce_records.add_ce': 'Please log in to add CE records.',
+    'ce_records.pending_records': 'Please log in to view pending records.',
+    'ce_records.analytics': 'Please log in to view analytics.',
+}
+
+
+@ce_bp.before_request
+def require_login():
+    """Turn away anonymous requests once, before any CE records view runs."""
+    if 'user_id' in session:
+        return None
+    if request.endpoint == 'ce_records.check_duplicate':
+        return jsonify({'duplicate': False})
+    if request.endpoint == 'ce_records.extract_pdf':
+        return jsonify({'error': 'Please log in.'}), 401
+    flash(_LOGIN_MESSAGES.get(request.endpoint, 'Please log in.'), 'error')
+    return redirect(url_for('auth.login'))
+
+
+# CSV and backup imports are far smaller than this; anything bigger is rejected before it is read
+MAX_IMPORT_SIZE = 10 * 1024 * 1024
+
+
+@ce_bp.errorhandler(413)
+def upload_too_large(e):
+    if request.endpoint == 'ce_records.extract_pdf':
+        return jsonify({'error': 'File is too large. Maximum size is 20MB.'}), 413
+    flash('File is too large to import. Maximum size is 10MB.', 'error')
+    return redirect(url_for('ce_records.dashboard'))
+
 
 @ce_bp.route('/dashboard')
 def dashboard():
-    if 'user_id' not in session:
-        flash('Please log in to access your dashboard.', 'error')
-        return redirect(url_for('auth.login'))
-
-    user = db.session.get(User, session['user_id'])
-    user_designations = UserDesignation.query.filter_by(user_id=user.id).all()
+    # Designations are joined onto the user row instead of costing a second query
+    user = db.session.get(User, session['user_id'], options=[joinedload(User.designations)])
+    user_designations = user.designations
     filter_category = request.args.get('category', '')
 
     query = CERecord.query.filter_by(user_id=user.id)
@@ -35,10 +76,11 @@ def dashboard():
     categories = [cat[0] for cat in all_categories if cat[0]]
     total_hours = sum(r.hours for r in ce_records)
 
+    designation_requirements = calculate_designation_requirements(user, user_designations)
     napfa_requirements = calculate_napfa_requirements(user) if user.is_napfa_member else None
     show_napfa = session.get('show_napfa_tracking', user.is_napfa_member)
-    designation_requirements = calculate_designation_requirements(user, user_designations)
-    pending_count = PendingCERecord.query.filter_by(user_id=user.id, status='pending').count()
+    pending_count = (db.session.query(func.count(PendingCERecord.id))
+                     .filter_by(user_id=user.id, status='pending').scalar())
 
     return render_template('dashboard.html', ce_records=ce_records, total_hours=total_hours,
                            categories=categories, filter_category=filter_category,
@@ -52,10 +94,6 @@ def dashboard():
 
 @ce_bp.route('/add_ce', methods=['GET', 'POST'])
 def add_ce():
-    if 'user_id' not in session:
-        flash('Please log in to add CE records.', 'error')
-        return redirect(url_for('auth.login'))
-
     user = db.session.get(User, session['user_id'])
 
     if request.method == 'POST':
@@ -97,9 +135,6 @@ def add_ce():
 
 @ce_bp.route('/check_duplicate', methods=['POST'])
 def check_duplicate():
-    if 'user_id' not in session:
-        return jsonify({'duplicate': False})
-
     title = request.form.get('title', '').strip()
     date_completed = request.form.get('date_completed', '').strip()
     hours = request.form.get('hours', '').strip()
@@ -113,7 +148,9 @@ def check_duplicate():
     except ValueError:
         return jsonify({'duplicate': False})
 
-    existing = CERecord.query.filter_by(
+    existing = CERecord.query.options(
+        load_only(CERecord.title, CERecord.date_completed, CERecord.hours)
+    ).filter_by(
         user_id=session['user_id'],
         title=title,
         date_completed=date_val,
@@ -134,31 +171,19 @@ def check_duplicate():
 
 @ce_bp.route('/delete_ce/<int:ce_id>', methods=['POST'])
 def delete_ce(ce_id):
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
-    ce_record = db.get_or_404(CERecord, ce_id)
-    if ce_record.user_id != session['user_id']:
-        flash('You do not have permission to delete this record.', 'error')
-        return redirect(url_for('ce_records.dashboard'))
+    # Ownership is part of the lookup, so another user's record is indistinguishable from a missing one
+    ce_record = CERecord.query.filter_by(id=ce_id, user_id=session['user_id']).first_or_404()
 
     db.session.delete(ce_record)
     db.session.commit()
+    purge_cached_pdfs(session['user_id'])
     flash('CE record deleted successfully!', 'success')
     return redirect(url_for('ce_records.dashboard'))
 
 
 @ce_bp.route('/edit_ce/<int:ce_id>', methods=['POST'])
 def edit_ce(ce_id):
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
-    ce_record = db.get_or_404(CERecord, ce_id)
-    if ce_record.user_id != session['user_id']:
-        flash('You do not have permission to edit this record.', 'error')
-        return redirect(url_for('ce_records.dashboard'))
+    ce_record = CERecord.query.filter_by(id=ce_id, user_id=session['user_id']).first_or_404()
 
     title = request.form.get('title')
     provider = request.form.get('provider')
@@ -198,33 +223,23 @@ def edit_ce(ce_id):
 
 @ce_bp.route('/toggle_napfa_tracking', methods=['POST'])
 def toggle_napfa_tracking():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
     session['show_napfa_tracking'] = not session.get('show_napfa_tracking', False)
     return redirect(url_for('ce_records.dashboard'))
 
 
 @ce_bp.route('/pending')
 def pending_records():
-    if 'user_id' not in session:
-        flash('Please log in to view pending records.', 'error')
-        return redirect(url_for('auth.login'))
-
     user = db.session.get(User, session['user_id'])
+    # created_at comes from the database clock at one-second resolution, so the id breaks ties
     records = PendingCERecord.query.filter_by(
         user_id=user.id, status='pending'
-    ).order_by(PendingCERecord.created_at.desc()).all()
+    ).order_by(PendingCERecord.created_at.desc(), PendingCERecord.id.desc()).all()
 
     return render_template('pending_records.html', records=records, user=user)
 
 
 @ce_bp.route('/pending/<int:record_id>/approve', methods=['POST'])
 def approve_pending(record_id):
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
     pending = db.get_or_404(PendingCERecord, record_id)
     if pending.user_id != session['user_id']:
         flash('You do not have permission to approve this record.', 'error')
@@ -269,10 +284,6 @@ def approve_pending(record_id):
 
 @ce_bp.route('/pending/<int:record_id>/reject', methods=['POST'])
 def reject_pending(record_id):
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
     pending = db.get_or_404(PendingCERecord, record_id)
     if pending.user_id != session['user_id']:
         flash('You do not have permission to reject this record.', 'error')
@@ -323,9 +334,6 @@ If a field cannot be determined, use null."""
 @ce_bp.route('/extract_pdf', methods=['POST'])
 def extract_pdf():
     """Extract CE data from an uploaded PDF or image using Claude vision."""
-    if 'user_id' not in session:
-        return jsonify({'error': 'Please log in.'}), 401
-
     import os
     import base64
 
@@ -427,42 +435,90 @@ def extract_pdf():
         return jsonify({'error': f'AI extraction failed: {e}'}), 500
 
 
-def _parse_csv_rows(content):
-    """Parse CSV content and return (rows, errors) for preview or import."""
-    reader = csv.DictReader(io.StringIO(content))
+def _existing_record_keys(user_id):
+    """Return the user's existing (title, date_completed, hours) tuples for duplicate detection."""
+    return set(
+        db.session.query(CERecord.title, CERecord.date_completed, CERecord.hours)
+        .filter_by(user_id=user_id)
+        .all()
+    )
+
+
+CSV_DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%d/%m/%Y', '%Y/%m/%d')
 
-    if not reader.fieldnames:
+# Normalized CSV header -> CE record field
+CSV_HEADER_ALIASES = {
+    'date completed': 'date_completed', 'date': 'date_completed', 'completion date': 'date_completed',
+    'title': 'title', 'course title': 'title', 'course name': 'title', 'name': 'title',
+    'provider': 'provider', 'sponsor': 'provider', 'source': 'provider',
+    'category': 'category', 'type': 'category', 'subject': 'category',
+    'hours': 'hours', 'credit hours': 'hours', 'credits': 'hours', 'ce hours': 'hours', 'cpe hours': 'hours',
+    'description': 'description', 'notes': 'description', 'details': 'description',
+}
+
+
+@lru_cache(maxsize=2048)
+def _parse_csv_date(date_str):
+    """Parse a CSV date cell, trying ISO first, then CSV_DATE_FORMATS. Returns None if nothing matches.
+
+    Imports repeat the same few dates across many rows, so results are memoized across rows and uploads.
+    """
+    try:
+        return date.fromisoformat(date_str)
+    except ValueError:
+        pass
+    for fmt in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _csv_cell(row, index):
+    """Return the stripped cell at index, or '' if the column is unmapped or the row is short."""
+    if index is None or index >= len(row):
+        return ''
+    return row[index].strip()
+
+
+def _parse_csv_rows(stream):
+    """Parse a text stream of CSV content and return (rows, errors) for preview or import."""
+    # Plain csv.reader + column indexes avoids building a dict per row like DictReader does
+    reader = csv.reader(stream)
+    fieldnames = next(reader, None)
+
+    if not fieldnames:
         return None, None, 'CSV file is empty or has no headers.'
 
     field_map = {}
-    for f in reader.fieldnames:
-        normalized = f.strip().lower().replace('_', ' ')
-        if normalized in ('date completed', 'date', 'completion date'):
-            field_map['date_completed'] = f
-        elif normalized in ('title', 'course title', 'course name', 'name'):
-            field_map['title'] = f
-        elif normalized in ('provider', 'sponsor', 'source'):
-            field_map['provider'] = f
-        elif normalized in ('category', 'type', 'subject'):
-            field_map['category'] = f
-        elif normalized in ('hours', 'credit hours', 'credits', 'ce hours', 'cpe hours'):
-            field_map['hours'] = f
-        elif normalized in ('description', 'notes', 'details'):
-            field_map['description'] = f
+    for index, f in enumerate(fieldnames):
+        field = CSV_HEADER_ALIASES.get(f.strip().lower().replace('_', ' '))
+        if field:
+            field_map[field] = index
 
     if 'title' not in field_map or 'hours' not in field_map:
-        return None, None, 'CSV must have at least "Title" and "Hours" columns. Found columns: ' + ', '.join(reader.fieldnames)
+        return None, None, 'CSV must have at least "Title" and "Hours" columns. Found columns: ' + ', '.join(fieldnames)
+
+    title_col = field_map['title']
+    hours_col = field_map['hours']
+    date_col = field_map.get('date_completed')
+    provider_col = field_map.get('provider')
+    category_col = field_map.get('category')
+    description_col = field_map.get('description')
 
     rows = []
     errors = []
+    existing_keys = _existing_record_keys(session['user_id'])
+    today = datetime.now().date()
 
     for row_num, row in enumerate(reader, start=2):
-        title = row.get(field_map.get('title', ''), '').strip()
-        hours_str = row.get(field_map.get('hours', ''), '').strip()
-        date_str = row.get(field_map.get('date_completed', ''), '').strip()
-        provider = row.get(field_map.get('provider', ''), '').strip()
-        category = row.get(field_map.get('category', ''), '').strip()
-        description = row.get(field_map.get('description', ''), '').strip()
+        title = _csv_cell(row, title_col)
+        hours_str = _csv_cell(row, hours_col)
+        date_str = _csv_cell(row, date_col)
+        provider = _csv_cell(row, provider_col)
+        category = _csv_cell(row, category_col)
+        description = _csv_cell(row, description_col)
 
         if not title and not hours_str:
             continue
@@ -484,27 +540,15 @@ def _parse_csv_rows(content):
 
         date_completed = None
         if date_str:
-            for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%d/%m/%Y', '%Y/%m/%d'):
-                try:
-                    date_completed = datetime.strptime(date_str, fmt).date()
-                    break
-                except ValueError:
-                    continue
+            date_completed = _parse_csv_date(date_str)
             if not date_completed:
                 warning = f'Could not parse date "{date_str}" — using today'
-                date_completed = datetime.now().date()
+                date_completed = today
         else:
-            date_completed = datetime.now().date()
+            date_completed = today
 
-        # Check for duplicates
-        existing = CERecord.query.filter_by(
-            user_id=session['user_id'],
-            title=title,
-            date_completed=date_completed,
-            hours=hours
-        ).first()
-
-        if existing:
+        is_duplicate = (title, date_completed, hours) in existing_keys
+        if is_duplicate:
             warning = 'Duplicate — already exists in your records'
 
         rows.append({
@@ -516,17 +560,31 @@ def _parse_csv_rows(content):
             'hours': hours,
             'description': description,
             'warning': warning,
-            'is_duplicate': existing is not None,
+            'is_duplicate': is_duplicate,
         })
 
     return rows, errors, None
 
 
+def bulk_add_ce(records):
+    """Insert CE record dicts with one executemany and commit once.
+
+    SQLAlchemy batches the rows under the driver's bound-parameter limit, so callers can pass any number.
+    Either every row is saved or, on error, none are.
+    """
+    try:
+        if records:
+            db.session.execute(insert(CERecord), records)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
 @ce_bp.route('/import_ce', methods=['POST'])
 def import_ce():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
+    if request.content_length and request.content_length > MAX_IMPORT_SIZE:
+        abort(413)
 
     # Step 1: CSV file upload → parse and show preview
     if 'csv_file' in request.files:
@@ -539,14 +597,14 @@ def import_ce():
             flash('Please upload a CSV file.', 'error')
             return redirect(url_for('ce_records.dashboard'))
 
+        # Decode while tokenizing rather than materializing the whole upload as one string
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
         try:
-            content = file.read().decode('utf-8-sig')
+            rows, errors, parse_error = _parse_csv_rows(stream)
         except UnicodeDecodeError:
             flash('Could not read the file. Please ensure it is a UTF-8 encoded CSV.', 'error')
             return redirect(url_for('ce_records.dashboard'))
 
-        rows, errors, parse_error = _parse_csv_rows(content)
-
         if parse_error:
             flash(parse_error, 'error')
             return redirect(url_for('ce_records.dashboard'))
@@ -570,6 +628,8 @@ def import_ce():
 
         imported = 0
         skipped = 0
+        existing_keys = _existing_record_keys(session['user_id'])
+        to_insert = []
 
         for row in confirmed:
             title = row.get('title', '').strip()
@@ -595,31 +655,25 @@ def import_ce():
                 skipped += 1
                 continue
 
-            # Final duplicate check
-            existing = CERecord.query.filter_by(
-                user_id=session['user_id'],
-                title=title,
-                date_completed=date_completed,
-                hours=hours
-            ).first()
-
-            if existing:
+            # Final duplicate check (also catches repeats within the same import)
+            key = (title, date_completed, hours)
+            if key in existing_keys:
                 skipped += 1
                 continue
-
-            record = CERecord(
-                user_id=session['user_id'],
-                title=title,
-                provider=provider,
-                hours=hours,
-                date_completed=date_completed,
-                category=category,
-                description=description
-            )
-            db.session.add(record)
+            existing_keys.add(key)
+
+            to_insert.append({
+                'user_id': session['user_id'],
+                'title': title,
+                'provider': provider,
+                'hours': hours,
+                'date_completed': date_completed,
+                'category': category,
+                'description': description,
+            })
             imported += 1
 
-        db.session.commit()
+        bulk_add_ce(to_insert)
 
         msg = f'Successfully imported {imported} CE record{"s" if imported != 1 else ""}.'
         if skipped:
@@ -632,49 +686,56 @@ def import_ce():
     return redirect(url_for('ce_records.dashboard'))
 
 
+# Rows fetched from the cursor and written to the response per chunk
+EXPORT_CHUNK_ROWS = 500
+
+
 @ce_bp.route('/export_ce')
 def export_ce():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
-    user = db.session.get(User, session['user_id'])
     filter_category = request.args.get('category', '')
 
-    query = CERecord.query.filter_by(user_id=user.id)
+    stmt = select(
+        CERecord.date_completed, CERecord.title, CERecord.provider,
+        CERecord.category, CERecord.hours, CERecord.description,
+    ).where(CERecord.user_id == session['user_id'])
     if filter_category:
-        query = query.filter(CERecord.category == filter_category)
-    ce_records = query.order_by(CERecord.date_completed.desc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date Completed', 'Title', 'Provider', 'Category', 'Hours', 'Description'])
-    for record in ce_records:
-        writer.writerow([
-            record.date_completed.strftime('%Y-%m-%d'),
-            record.title, record.provider or '', record.category or '',
-            record.hours, record.description or ''
-        ])
+        stmt = stmt.where(CERecord.category == filter_category)
+    stmt = stmt.order_by(CERecord.date_completed.desc()).execution_options(yield_per=EXPORT_CHUNK_ROWS)
+
+    def generate():
+        # Rows go into a reusable buffer that is yielded every EXPORT_CHUNK_ROWS rows, so the full CSV is
+        # never held in memory and the response isn't split into one tiny write per row
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['Date Completed', 'Title', 'Provider', 'Category', 'Hours', 'Description'])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for partition in db.session.execute(stmt).partitions():
+            writer.writerows(
+                [record.date_completed.strftime('%Y-%m-%d'),
+                 record.title, record.provider or '', record.category or '',
+                 record.hours, record.description or '']
+                for record in partition
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
 
     filename = f'ce_records_{datetime.now().strftime("%Y%m%d")}.csv'
     if filter_category:
         filename = f'ce_records_{filter_category.replace(" ", "_")}_{datetime.now().strftime("%Y%m%d")}.csv'
 
-    output.seek(0)
-    return Response(output.getvalue(), mimetype='text/csv',
+    return Response(stream_with_context(generate()), mimetype='text/csv',
                     headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 
-@ce_bp.route('/export_pdf')
-def export_pdf():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
-    user = db.session.get(User, session['user_id'])
-    filter_category = request.args.get('category', '')
-
-    query = CERecord.query.filter_by(user_id=user.id)
+def _render_ce_pdf(user, filter_category):
+    """Render the user's CE records (optionally one category) as PDF bytes."""
+    query = db.session.query(
+        CERecord.date_completed, CERecord.title, CERecord.provider,
+        CERecord.category, CERecord.hours, CERecord.description,
+    ).filter(CERecord.user_id == user.id)
     if filter_category:
         query = query.filter(CERecord.category == filter_category)
     ce_records = query.order_by(CERecord.date_completed.desc()).all()
@@ -697,20 +758,38 @@ def export_pdf():
     elements.append(Paragraph(f'Total Records: {len(ce_records)} | Total Hours: {total_hours:.1f}', styles['Normal']))
     elements.append(Spacer(1, 0.25 * inch))
 
+    # Wrapped cells use the same 8pt size as the plain-string cells the table style sets
+    wrapped = ParagraphStyle('CECell', parent=styles['Normal'], fontSize=8, leading=10)
+
+    def cell(text, limit, fits):
+        # Short text fits on one line, so hand ReportLab the plain string and skip Paragraph layout.
+        # Also returns a generous estimate of the wrapped line count, used for the row height.
+        text = text[:limit]
+        if len(text) <= fits:
+            return text, 1
+        return Paragraph(text, wrapped), len(text) * 5 // (fits * 4) + 1
+
     header = ['Date', 'Title', 'Provider', 'Category', 'Hours', 'Description']
     data = [header]
+    # Explicit row heights spare Table from measuring every cell, which is quadratic on long tables
+    row_heights = [0.3 * inch]
     for record in ce_records:
+        title, title_lines = cell(record.title, 60, 35)
+        provider, provider_lines = cell(record.provider or '', 40, 25)
+        description, description_lines = cell(record.description or '', 80, 35)
         data.append([
             record.date_completed.strftime('%Y-%m-%d'),
-            Paragraph(record.title[:60], styles['Normal']),
-            Paragraph((record.provider or '')[:40], styles['Normal']),
+            title,
+            provider,
             record.category or '',
             str(record.hours),
-            Paragraph((record.description or '')[:80], styles['Normal']),
+            description,
         ])
+        lines = max(title_lines, provider_lines, description_lines)
+        row_heights.append(0.28 * inch if lines == 1 else 8 + lines * wrapped.leading)
 
     col_widths = [0.9 * inch, 2.5 * inch, 1.8 * inch, 1.5 * inch, 0.7 * inch, 2.6 * inch]
-    table = Table(data, colWidths=col_widths, repeatRows=1)
+    table = Table(data, colWidths=col_widths, rowHeights=row_heights, repeatRows=1)
     table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2563eb')),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -726,71 +805,155 @@ def export_pdf():
     ]))
     elements.append(table)
     doc.build(elements)
-    buffer.seek(0)
+    return buffer.getvalue()
+
+
+def _records_version(user_id):
+    """Return (record count, latest insert/edit time) for a user's CE records; changes whenever they do."""
+    return db.session.query(
+        func.count(CERecord.id), func.max(CERecord.updated_at)
+    ).filter_by(user_id=user_id).one()
+
+
+def _pdf_cache_path(user, filter_category):
+    """Return the cache file for this export, named after everything the PDF content depends on."""
+    record_count, last_change = _records_version(user.id)
+    fingerprint = hashlib.sha256(repr(
+        (user.username, filter_category, record_count, last_change, date.today())
+    ).encode()).hexdigest()[:32]
+    return os.path.join(_pdf_cache_dir(), f'{user.id}-{fingerprint}.pdf')
+
+
+# Cache names include the date, so files from earlier days are never served again
+PDF_CACHE_MAX_AGE = 24 * 60 * 60
+
+
+def _pdf_cache_dir():
+    # The app's own instance folder, not the shared temp directory: the files hold users' CE history
+    return current_app.config.get('PDF_CACHE_DIR') or os.path.join(current_app.instance_path, 'pdf_cache')
+
+
+def _store_cached_pdf(path, pdf):
+    """Atomically write a rendered PDF to the cache, replacing the user's older exports and expiring stale ones."""
+    cache_dir, name = os.path.split(path)
+    user_prefix = name.split('-', 1)[0] + '-'
+    expired = time.time() - PDF_CACHE_MAX_AGE
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        for entry in os.scandir(cache_dir):
+            if entry.name != name and (entry.name.startswith(user_prefix) or entry.stat().st_mtime < expired):
+                os.remove(entry.path)
+        # NamedTemporaryFile creates the file readable by its owner only
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False) as tmp:
+            tmp.write(pdf)
+        os.replace(tmp.name, path)
+    except OSError as e:
+        print(f"[PDF] Could not cache export: {e}")
+
+
+def purge_cached_pdfs(user_id):
+    """Delete every cached PDF export of a user, e.g. once their records or account are gone."""
+    cache_dir = _pdf_cache_dir()
+    try:
+        for entry in os.scandir(cache_dir):
+            if entry.name.startswith(f'{user_id}-'):
+                os.remove(entry.path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[PDF] Could not remove cached exports: {e}")
+
+
+@ce_bp.route('/export_pdf')
+def export_pdf():
+    user = db.session.get(User, session['user_id'])
+    filter_category = request.args.get('category', '')
+
+    # Rendering is the slow part, so repeat downloads of an unchanged report come from the file cache
+    cache_path = _pdf_cache_path(user, filter_category)
+    try:
+        with open(cache_path, 'rb') as f:
+            pdf = f.read()
+    except OSError:
+        pdf = _render_ce_pdf(user, filter_category)
+        _store_cached_pdf(cache_path, pdf)
 
     filename = f'ce_records_{datetime.now().strftime("%Y%m%d")}.pdf'
     if filter_category:
         filename = f'ce_records_{filter_category.replace(" ", "_")}_{datetime.now().strftime("%Y%m%d")}.pdf'
 
-    return Response(buffer.getvalue(), mimetype='application/pdf',
+    return Response(pdf, mimetype='application/pdf',
                     headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 
 @ce_bp.route('/export_backup')
 def export_backup():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
-
-    user = db.session.get(User, session['user_id'])
-    ce_records = CERecord.query.filter_by(user_id=user.id).order_by(CERecord.date_completed.desc()).all()
-    designations = UserDesignation.query.filter_by(user_id=user.id).all()
-
-    backup = {
-        'exported_at': datetime.now(timezone.utc).isoformat(),
-        'user': {
+    # The user's designations come back joined onto the user row, so the backup needs one query for
+    # the user and designations and one (streamed) for the records
+    user = db.session.get(User, session['user_id'], options=[joinedload(User.designations)])
+
+    # orjson writes the date and datetime values as ISO 8601 strings itself
+    head = (
+        b'{\n  "exported_at": ' + orjson.dumps(datetime.now(timezone.utc)) +
+        b',\n  "user": ' + orjson.dumps({
             'username': user.username,
             'email': user.email,
             'is_napfa_member': user.is_napfa_member,
-            'napfa_join_date': user.napfa_join_date.isoformat() if user.napfa_join_date else None,
-        },
-        'designations': [
+            'napfa_join_date': user.napfa_join_date,
+        }) +
+        b',\n  "designations": ' + orjson.dumps([
             {
                 'designation': d.designation,
                 'birth_month': d.birth_month,
                 'state': d.state,
-                'custom_period_end': d.custom_period_end.isoformat() if d.custom_period_end else None,
+                'custom_period_end': d.custom_period_end,
             }
-            for d in designations
-        ],
-        'ce_records': [
-            {
-                'title': r.title,
-                'provider': r.provider or '',
-                'hours': r.hours,
-                'date_completed': r.date_completed.isoformat(),
-                'category': r.category or '',
-                'description': r.description or '',
-                'is_napfa_approved': r.is_napfa_approved,
-                'is_ethics_course': r.is_ethics_course,
-                'napfa_subject_area': r.napfa_subject_area or '',
-            }
-            for r in ce_records
-        ],
-    }
+            for d in user.designations
+        ]) +
+        b',\n  "ce_records": ['
+    )
+
+    stmt = select(
+        CERecord.title, CERecord.provider, CERecord.hours, CERecord.date_completed,
+        CERecord.category, CERecord.description, CERecord.is_napfa_approved,
+        CERecord.is_ethics_course, CERecord.napfa_subject_area,
+    ).where(CERecord.user_id == user.id).order_by(CERecord.date_completed.desc()).execution_options(
+        yield_per=EXPORT_CHUNK_ROWS)
+
+    def generate():
+        # The records array is framed by hand and written one cursor partition at a time, one record per
+        # line, so a large account's backup is never built up as a single dict or bytes object
+        yield head
+        separator = b'\n    '
+        for partition in db.session.execute(stmt).partitions():
+            chunk = []
+            for r in partition:
+                chunk.append(separator)
+                chunk.append(orjson.dumps({
+                    'title': r.title,
+                    'provider': r.provider or '',
+                    'hours': r.hours,
+                    'date_completed': r.date_completed,
+                    'category': r.category or '',
+                    'description': r.description or '',
+                    'is_napfa_approved': r.is_napfa_approved,
+                    'is_ethics_course': r.is_ethics_course,
+                    'napfa_subject_area': r.napfa_subject_area or '',
+                }))
+                separator = b',\n    '
+            yield b''.join(chunk)
+        yield b'\n  ]\n}\n'
 
-    output = json.dumps(backup, indent=2)
     filename = f'ce_tracker_backup_{datetime.now().strftime("%Y%m%d")}.json'
 
-    return Response(output, mimetype='application/json',
+    return Response(stream_with_context(generate()), mimetype='application/json',
                     headers={'Content-Disposition': f'attachment; filename={filename}'})
 
 
 @ce_bp.route('/import_backup', methods=['POST'])
 def import_backup():
-    if 'user_id' not in session:
-        flash('Please log in.', 'error')
-        return redirect(url_for('auth.login'))
+    if request.content_length and request.content_length > MAX_IMPORT_SIZE:
+        abort(413)
 
     if 'backup_file' not in request.files:
         flash('No file selected.', 'error')
@@ -806,8 +969,7 @@ def import_backup():
         return redirect(url_for('ce_records.dashboard'))
 
     try:
-        content = file.read().decode('utf-8')
-        data = json.loads(content)
+        data = orjson.loads(file.read())
 
         if not isinstance(data, dict) or 'ce_records' not in data:
             flash('Invalid backup file: missing "ce_records" key.', 'error')
@@ -821,6 +983,8 @@ def import_backup():
         imported = 0
         skipped = 0
         errors = []
+        existing_keys = _existing_record_keys(session['user_id'])
+        to_insert = []
 
         for i, entry in enumerate(records):
             if not isinstance(entry, dict):
@@ -851,7 +1015,7 @@ def import_backup():
             date_completed = None
             if date_str:
                 try:
-                    date_completed = datetime.strptime(date_str, '%Y-%m-%d').date()
+                    date_completed = date.fromisoformat(date_str)
                 except ValueError:
                     errors.append(f'Record {i + 1}: invalid date "{date_str}" for "{title}", using today')
                     date_completed = datetime.now().date()
@@ -859,33 +1023,27 @@ def import_backup():
                 date_completed = datetime.now().date()
 
             # Duplicate detection: same title + date + hours
-            existing = CERecord.query.filter_by(
-                user_id=session['user_id'],
-                title=title,
-                date_completed=date_completed,
-                hours=hours
-            ).first()
-
-            if existing:
+            key = (title, date_completed, hours)
+            if key in existing_keys:
                 skipped += 1
                 continue
-
-            record = CERecord(
-                user_id=session['user_id'],
-                title=title,
-                provider=str(entry.get('provider', '')).strip(),
-                hours=hours,
-                date_completed=date_completed,
-                category=str(entry.get('category', '')).strip(),
-                description=str(entry.get('description', '')).strip(),
-                is_napfa_approved=bool(entry.get('is_napfa_approved', False)),
-                is_ethics_course=bool(entry.get('is_ethics_course', False)),
-                napfa_subject_area=str(entry.get('napfa_subject_area', '')).strip(),
-            )
-            db.session.add(record)
+            existing_keys.add(key)
+
+            to_insert.append({
+                'user_id': session['user_id'],
+                'title': title,
+                'provider': str(entry.get('provider', '')).strip(),
+                'hours': hours,
+                'date_completed': date_completed,
+                'category': str(entry.get('category', '')).strip(),
+                'description': str(entry.get('description', '')).strip(),
+                'is_napfa_approved': bool(entry.get('is_napfa_approved', False)),
+                'is_ethics_course': bool(entry.get('is_ethics_course', False)),
+                'napfa_subject_area': str(entry.get('napfa_subject_area', '')).strip(),
+            })
             imported += 1
 
-        db.session.commit()
+        bulk_add_ce(to_insert)
 
         msg = f'Successfully restored {imported} CE record{"s" if imported != 1 else ""}.'
         if skipped:
@@ -895,10 +1053,9 @@ def import_backup():
         if errors:
             flash('Import notes: ' + '; '.join(errors[:10]) + ('...' if len(errors) > 10 else ''), 'info')
 
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
+        # orjson reports invalid UTF-8 as a decode error too
         flash('Invalid JSON file. Please upload a valid backup file.', 'error')
-    except UnicodeDecodeError:
-        flash('Could not read the file. Please ensure it is a UTF-8 encoded JSON file.', 'error')
     except Exception as e:
         db.session.rollback()
         flash(f'Error restoring backup: {str(e)}', 'error')
@@ -908,46 +1065,39 @@ def import_backup():
 
 @ce_bp.route('/analytics')
 def analytics():
-    if 'user_id' not in session:
-        flash('Please log in to view analytics.', 'error')
-        return redirect(url_for('auth.login'))
-
     user = db.session.get(User, session['user_id'])
-    ce_records = CERecord.query.filter_by(user_id=user.id).order_by(CERecord.date_completed.desc()).all()
-
-    category_hours = {}
-    for r in ce_records:
-        cat = r.category or 'Uncategorized'
-        category_hours[cat] = category_hours.get(cat, 0) + r.hours
-
-    monthly_hours = {}
-    now = datetime.now()
-    for i in range(11, -1, -1):
-        month_date = datetime(now.year, now.month, 1) - timedelta(days=i * 30)
-        key = month_date.strftime('%Y-%m')
-        monthly_hours[key] = 0
-    for r in ce_records:
-        key = r.date_completed.strftime('%Y-%m')
+    hours_sum = func.sum(CERecord.hours)
+
+    # Each chart is a GROUP BY in the database; only the per-group totals come back
+    category_hours = defaultdict(float)
+    for category, hours in (db.session.query(CERecord.category, hours_sum)
+                            .filter_by(user_id=user.id).group_by(CERecord.category)):
+        category_hours[category or 'Uncategorized'] += hours
+
+    this_month = date.today().replace(day=1)
+    monthly_hours = {(this_month - relativedelta(months=i)).strftime('%Y-%m'): 0 for i in range(11, -1, -1)}
+    # Yearly totals are rolled up from the same per-month groups in one pass
+    yearly_hours = defaultdict(float)
+    year_col = extract('year', CERecord.date_completed)
+    month_col = extract('month', CERecord.date_completed)
+    for year, month, hours in (db.session.query(year_col, month_col, hours_sum)
+                               .filter_by(user_id=user.id).group_by(year_col, month_col)):
+        yearly_hours[str(int(year))] += hours
+        key = f'{int(year):04d}-{int(month):02d}'
         if key in monthly_hours:
-            monthly_hours[key] += r.hours
+            monthly_hours[key] += hours
 
-    provider_hours = {}
-    for r in ce_records:
-        prov = r.provider or 'Unknown'
-        if prov:
-            provider_hours[prov] = provider_hours.get(prov, 0) + r.hours
+    provider_hours = defaultdict(float)
+    for provider, hours in (db.session.query(CERecord.provider, hours_sum)
+                            .filter_by(user_id=user.id).group_by(CERecord.provider)):
+        provider_hours[provider or 'Unknown'] += hours
     top_providers = sorted(provider_hours.items(), key=lambda x: x[1], reverse=True)[:10]
 
-    total_hours = sum(r.hours for r in ce_records)
-    total_records = len(ce_records)
+    total_hours, total_records = (db.session.query(func.coalesce(hours_sum, 0), func.count(CERecord.id))
+                                  .filter_by(user_id=user.id).one())
     avg_hours = total_hours / total_records if total_records else 0
     categories_count = len(category_hours)
 
-    yearly_hours = {}
-    for r in ce_records:
-        year = str(r.date_completed.year)
-        yearly_hours[year] = yearly_hours.get(year, 0) + r.hours
-
     return render_template('analytics.html', user=user,
                            category_hours=category_hours,
                            monthly_hours=monthly_hours,
@@ -2,17 +2,21 @@ from datetime import datetime
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 
 from models import db, User, UserDesignation
-from designation_helpers import DESIGNATION_REQUIREMENTS, ALLOWED_DESIGNATIONS
+from designation_helpers import DESIGNATION_REQUIREMENTS, ALLOWED_DESIGNATIONS, US_STATES
 
 designations_bp = Blueprint('designations', __name__)
 
 
-@designations_bp.route('/manage_designations', methods=['GET', 'POST'])
-def manage_designations():
+@designations_bp.before_request
+def require_login():
+    """Turn away anonymous requests once, before any designations view runs."""
     if 'user_id' not in session:
         flash('Please log in to manage your designations.', 'error')
         return redirect(url_for('auth.login'))
 
+
+@designations_bp.route('/manage_designations', methods=['GET', 'POST'])
+def manage_designations():
     user = db.session.get(User, session['user_id'])
     user_designations = UserDesignation.query.filter_by(user_id=user.id).all()
     current_designations = {ud.designation: ud for ud in user_designations}
@@ -52,7 +56,7 @@ def manage_designations():
                 if not cpa_state:
                     flash('State is required for CPA designation.', 'error')
                     return redirect(url_for('designations.manage_designations'))
-                if len(cpa_state) != 2 or not cpa_state.isalpha():
+                if cpa_state.upper() not in US_STATES:
                     flash('Invalid state abbreviation. Please use a 2-letter state code (e.g., CA, NY, TX).', 'error')
                     return redirect(url_for('designations.manage_designations'))
                 state = cpa_state.upper()
@@ -69,11 +73,7 @@ def manage_designations():
 
         elif action == 'remove':
             designation_id = request.form.get('designation_id')
-            ud = db.get_or_404(UserDesignation, designation_id)
-
-            if ud.user_id != user.id:
-                flash('You do not have permission to remove this designation.', 'error')
-                return redirect(url_for('designations.manage_designations'))
+            ud = UserDesignation.query.filter_by(id=designation_id, user_id=user.id).first_or_404()
 
             designation_name = ud.designation
             db.session.delete(ud)
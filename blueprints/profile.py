@@ -1,11 +1,84 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from models import db, User, UserDesignation, Feedback
+from security import hash_password, verify_password
 
 profile_bp = Blueprint('profile', __name__)
 
 
+def _email_change_error(user, new_email):
+    """Return the message explaining why new_email can't be used, or None if it can."""
+    if not new_email:
+        return 'Email is required.'
+    if '@' not in new_email or '.' not in new_email:
+        return 'Please enter a valid email address.'
+    if new_email == user.email:
+        return 'That is already your current email.'
+    return None
+
+
+def _password_change_error(user, current_password, new_password, confirm_password):
+    """Return the message explaining why the password change is rejected, or None if it is allowed."""
+    # Always pay for the hash, so a blank field can't be told apart from a wrong password by timing
+    password_ok = verify_password(user.password_hash, current_password)
+    if not current_password:
+        return 'Current password is required.'
+    if not password_ok:
+        return 'Current password is incorrect.'
+    if not new_password:
+        return 'New password is required.'
+    if len(new_password) < 6:
+        return 'New password must be at least 6 characters long.'
+    if new_password != confirm_password:
+        return 'New passwords do not match.'
+    return None
+
+
+def _handle_update_email(user):
+    new_email = request.form.get('email', '').strip()
+    error = _email_change_error(user, new_email)
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('profile.profile'))
+
+    # The unique constraint on users.email is the duplicate check; no separate lookup needed
+    user.email = new_email
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        flash('That email is already in use by another account.', 'error')
+        return redirect(url_for('profile.profile'))
+    flash('Email updated successfully!', 'success')
+    return redirect(url_for('profile.profile'))
+
+
+def _handle_change_password(user):
+    new_password = request.form.get('new_password', '')
+    error = _password_change_error(
+        user,
+        request.form.get('current_password', ''),
+        new_password,
+        request.form.get('confirm_password', ''),
+    )
+    if error:
+        flash(error, 'error')
+        return redirect(url_for('profile.profile'))
+
+    user.password_hash = hash_password(new_password)
+    db.session.commit()
+    flash('Password changed successfully!', 'success')
+    return redirect(url_for('profile.profile'))
+
+
+_POST_HANDLERS = {
+    'update_email': _handle_update_email,
+    'change_password': _handle_change_password,
+}
+
+
 @profile_bp.route('/profile', methods=['GET', 'POST'])
 def profile():
     if 'user_id' not in session:
@@ -15,57 +88,12 @@ def profile():
     user = db.session.get(User, session['user_id'])
 
     if request.method == 'POST':
-        action = request.form.get('action')
-
-        if action == 'update_email':
-            new_email = request.form.get('email', '').strip()
-            if not new_email:
-                flash('Email is required.', 'error')
-                return redirect(url_for('profile.profile'))
-            if '@' not in new_email or '.' not in new_email:
-                flash('Please enter a valid email address.', 'error')
-                return redirect(url_for('profile.profile'))
-
-            existing = User.query.filter_by(email=new_email).first()
-            if existing and existing.id != user.id:
-                flash('That email is already in use by another account.', 'error')
-                return redirect(url_for('profile.profile'))
-            if new_email == user.email:
-                flash('That is already your current email.', 'error')
-                return redirect(url_for('profile.profile'))
-
-            user.email = new_email
-            db.session.commit()
-            flash('Email updated successfully!', 'success')
-            return redirect(url_for('profile.profile'))
-
-        elif action == 'change_password':
-            current_password = request.form.get('current_password', '')
-            new_password = request.form.get('new_password', '')
-            confirm_password = request.form.get('confirm_password', '')
-
-            if not current_password:
-                flash('Current password is required.', 'error')
-                return redirect(url_for('profile.profile'))
-            if not check_password_hash(user.password_hash, current_password):
-                flash('Current password is incorrect.', 'error')
-                return redirect(url_for('profile.profile'))
-            if not new_password:
-                flash('New password is required.', 'error')
-                return redirect(url_for('profile.profile'))
-            if len(new_password) < 6:
-                flash('New password must be at least 6 characters long.', 'error')
-                return redirect(url_for('profile.profile'))
-            if new_password != confirm_password:
-                flash('New passwords do not match.', 'error')
-                return redirect(url_for('profile.profile'))
-
-            user.password_hash = generate_password_hash(new_password)
-            db.session.commit()
-            flash('Password changed successfully!', 'success')
-            return redirect(url_for('profile.profile'))
-
-    designation_count = UserDesignation.query.filter_by(user_id=user.id).count()
+        handler = _POST_HANDLERS.get(request.form.get('action'))
+        if handler:
+            return handler(user)
+
+    # Plain COUNT rather than Query.count(), which wraps the whole row query in a subquery
+    designation_count = db.session.query(func.count(UserDesignation.id)).filter_by(user_id=user.id).scalar()
     return render_template('profile.html', user=user, designation_count=designation_count)
 
 
@@ -100,7 +128,13 @@ def submit_feedback():
         message=message, user_id=session.get('user_id')
     )
     db.session.add(feedback)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('Failed to save feedback')
+        flash('Sorry, your feedback could not be saved. Please try again.', 'error')
+        return redirect(request.referrer or url_for('ce_records.dashboard'))
 
     flash('Thank you for your feedback! We appreciate you taking the time to help us improve.', 'success')
     return redirect(request.referrer or url_for('ce_records.dashboard'))
@@ -1,6 +1,8 @@
 """Check CE deadlines and send reminder emails to users approaching or past due."""
 from datetime import datetime, timedelta, timezone
 
+from sqlalchemy.orm import selectinload
+
 from models import db, User, UserDesignation
 from designation_helpers import DESIGNATION_CALCULATORS
 from email_helper import send_email
@@ -33,11 +35,12 @@ def check_and_send_deadline_reminders() -> dict:
         'errors': 0,
     }
 
-    # Get all active users who have at least one designation
+    # Get all active users who have at least one designation, with their designations in one more SELECT
     users = (
         User.query
         .filter(User.is_active == True)
         .join(UserDesignation)
+        .options(selectinload(User.designations))
         .all()
     )
 
@@ -1,7 +1,12 @@
 """Designation CE requirement calculators."""
-from datetime import datetime, timedelta
+from datetime import date, timedelta
+from functools import lru_cache
+from types import MappingProxyType
 from dateutil.relativedelta import relativedelta
-from models import CERecord
+from flask import g, has_app_context
+from sqlalchemy import and_, case, event, func, or_
+from sqlalchemy.orm import Session
+from models import db, CERecord
 
 
 # Cycle lengths by designation (years)
@@ -23,476 +28,313 @@ def _apply_custom_period(user_designation, period_start, period_end):
     return custom_start, custom_end
 
 
-def calculate_cfp_requirements(user, user_designation):
-    if not user_designation or user_designation.designation != 'CFP' or not user_designation.birth_month:
-        return None
+# Period rules take today's date from the caller, so one request computes it once for every designation.
+# The date math itself depends only on today and a per-designation anchor, so it is memoized on those
+# and shared by every request made on the same day.
 
-    birth_month = user_designation.birth_month
-    current_date = datetime.now().date()
-    current_year = current_date.year
+@lru_cache(maxsize=512)
+def _period_for_cfp(today, birth_month):
+    """CFP cycles run two years, ending the month before the certificant's birth month."""
+    current_year = today.year
 
-    if current_date.month < birth_month:
-        period_start = datetime(current_year - 2, birth_month, 1).date()
-        period_end = datetime(current_year, birth_month, 1).date() - timedelta(days=1)
+    if today.month < birth_month:
+        period_start = date(current_year - 2, birth_month, 1)
+        period_end = date(current_year, birth_month, 1) - timedelta(days=1)
     else:
-        period_start = datetime(current_year - 1, birth_month, 1).date()
-        period_end = datetime(current_year + 1, birth_month, 1).date() - timedelta(days=1)
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    total_hours = sum(r.hours for r in ce_records)
-    ethics_hours = sum(r.hours for r in ce_records if 'ethics' in (r.category or '').lower() or 'ethics' in (r.title or '').lower())
-
-    return {
-        'designation': 'CFP',
-        'total_required': 30.0,
-        'total_earned': total_hours,
-        'total_remaining': max(0, 30.0 - total_hours),
-        'total_percentage': min(100, max(0, total_hours / 30.0 * 100)),
-        'ethics_required': 2.0,
-        'ethics_earned': min(ethics_hours, 2.0),
-        'ethics_remaining': max(0, 2.0 - ethics_hours),
-        'ethics_percentage': min(100, max(0, ethics_hours / 2.0 * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= 30.0 and ethics_hours >= 2.0
-    }
+        period_start = date(current_year - 1, birth_month, 1)
+        period_end = date(current_year + 1, birth_month, 1) - timedelta(days=1)
+    return period_start, period_end
 
 
-def calculate_cpa_requirements(user, user_designation):
-    if not user_designation or user_designation.designation != 'CPA':
-        return None
+@lru_cache(maxsize=512)
+def _period_for_calendar_year(today):
+    return date(today.year, 1, 1), date(today.year, 12, 31)
 
-    current_year = datetime.now().year
-    period_start = datetime(current_year, 1, 1).date()
-    period_end = datetime(current_year, 12, 31).date()
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
+@lru_cache(maxsize=512)
+def _period_for_biennial(today):
+    """Two calendar-year cycles starting in odd years."""
+    cycle_start = today.year - 1 if today.year % 2 == 0 else today.year
+    return date(cycle_start, 1, 1), date(cycle_start + 1, 12, 31)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
 
-    total_hours = sum(r.hours for r in ce_records)
-    hours_required = 40.0
+@lru_cache(maxsize=512)
+def _period_for_triennial(today):
+    """EA enrollment cycles are three calendar years starting in a multiple of three."""
+    cycle_start_year = (today.year // 3) * 3
+    return date(cycle_start_year, 1, 1), date(cycle_start_year + 2, 12, 31)
 
-    return {
-        'designation': 'CPA',
-        'state': user_designation.state,
-        'total_required': hours_required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, hours_required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / hours_required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= hours_required
-    }
 
+@lru_cache(maxsize=512)
+def _period_for_cepi(today, anchor):
+    """CEPI cycles run two years from the designation date."""
+    years_since = (today - anchor).days / 365.25
+    period_number = int(years_since // 2)
 
-def calculate_ea_requirements(user, user_designation):
-    if not user_designation or user_designation.designation != 'EA':
+    period_start = date(
+        anchor.year + (period_number * 2),
+        anchor.month,
+        anchor.day
+    )
+    period_end = date(
+        anchor.year + ((period_number + 1) * 2),
+        anchor.month,
+        anchor.day
+    ) - timedelta(days=1)
+    return period_start, period_end
+
+
+def _cfp_period(user_designation, today):
+    if not user_designation.birth_month:
         return None
-
-    current_date = datetime.now().date()
-    current_year = current_date.year
-    cycle_start_year = (current_year // 3) * 3
-    period_start = datetime(cycle_start_year, 1, 1).date()
-    period_end = datetime(cycle_start_year + 2, 12, 31).date()
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    current_year_start = datetime(current_year, 1, 1).date()
-    current_year_end = datetime(current_year, 12, 31).date()
-    current_year_records = [r for r in ce_records if current_year_start <= r.date_completed <= current_year_end]
-
-    total_hours = sum(r.hours for r in ce_records)
-    current_year_hours = sum(r.hours for r in current_year_records)
-    ethics_hours = sum(r.hours for r in ce_records if 'ethics' in (r.category or '').lower() or 'ethics' in (r.title or '').lower())
-
-    return {
-        'designation': 'EA',
-        'total_required': 72.0,
-        'total_earned': total_hours,
-        'total_remaining': max(0, 72.0 - total_hours),
-        'total_percentage': min(100, max(0, total_hours / 72.0 * 100)),
-        'yearly_minimum': 16.0,
-        'current_year_hours': current_year_hours,
-        'yearly_percentage': min(100, max(0, current_year_hours / 16.0 * 100)),
-        'ethics_required': 2.0,
-        'ethics_earned': min(ethics_hours, 2.0),
-        'ethics_remaining': max(0, 2.0 - ethics_hours),
-        'ethics_percentage': min(100, max(0, ethics_hours / 2.0 * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= 72.0 and current_year_hours >= 16.0 and ethics_hours >= 2.0
-    }
+    return _period_for_cfp(today, user_designation.birth_month)
+
+
+def _calendar_year_period(user_designation, today):
+    return _period_for_calendar_year(today)
+
+
+def _biennial_period(user_designation, today):
+    return _period_for_biennial(today)
+
+
+def _ea_period(user_designation, today):
+    return _period_for_triennial(today)
+
+
+def _cepi_period(user_designation, today):
+    """The current CEPI cycle is counted up to today unless the user set their own period end."""
+    designation_date = user_designation.created_at.date() if user_designation.created_at else today
+    period_start, period_end = _period_for_cepi(today, designation_date)
+    if not user_designation.custom_period_end and period_end > today:
+        period_end = today
+    return period_start, period_end
+
+
+# Requirement rules per designation. Every designation needs `total` hours within its `period`;
+# `ethics` and `yearly_minimum` add those sub-requirements, and `extra` is copied into the result.
+DESIGNATION_SPECS = {
+    'CFP': {'period': _cfp_period, 'total': 30.0, 'ethics': 2.0},
+    'CPA': {'period': _calendar_year_period, 'total': 40.0, 'show_state': True},
+    'EA': {'period': _ea_period, 'total': 72.0, 'ethics': 2.0, 'yearly_minimum': 16.0},
+    # CEPI designations
+    'CEP': {'period': _cepi_period, 'total': 30.0, 'extra': {'admin_fee': 250.0, 'volunteer_hours_required': 15.0}},
+    'ECA': {'period': _cepi_period, 'total': 30.0, 'extra': {'admin_fee': 250.0, 'volunteer_hours_required': 15.0}},
+    # CFA Institute: 20 PL credits per calendar year
+    'CFA': {'period': _calendar_year_period, 'total': 20.0},
+    # The American College
+    'CLU': {'period': _biennial_period, 'total': 30.0},
+    'ChFC': {'period': _biennial_period, 'total': 30.0},
+    'RICP': {'period': _biennial_period, 'total': 30.0},
+    # Investments & Wealth Institute
+    'CIMA': {'period': _biennial_period, 'total': 40.0},
+    'CIMC': {'period': _biennial_period, 'total': 40.0},
+    'CPWA': {'period': _biennial_period, 'total': 40.0},
+    'CRPS': {'period': _biennial_period, 'total': 16.0},
+    'CDFA': {'period': _calendar_year_period, 'total': 15.0},
+    # Fi360
+    'AIF': {'period': _calendar_year_period, 'total': 6.0},
+    # IAR: 12 hours per year, including 6 ethics/products
+    'IAR': {'period': _calendar_year_period, 'total': 12.0, 'ethics': 6.0},
+}
 
 
-def _calculate_cepi_requirements(user, user_designation, designation_name):
-    """Shared logic for CEP and ECA (both CEPI designations with same requirements)."""
-    if not user_designation or user_designation.designation != designation_name:
+def _period_for(user_designation, today):
+    """Return the (start, end) reporting period for a designation, or None if it can't be determined."""
+    spec = DESIGNATION_SPECS.get(user_designation.designation)
+    period = spec['period'](user_designation, today) if spec else None
+    if period is None:
         return None
+    return _apply_custom_period(user_designation, *period)
 
-    current_date = datetime.now().date()
-    designation_date = user_designation.created_at.date() if user_designation.created_at else current_date
-    years_since = (current_date - designation_date).days / 365.25
-    period_number = int(years_since // 2)
-
-    period_start = datetime(
-        designation_date.year + (period_number * 2),
-        designation_date.month,
-        designation_date.day
-    ).date()
-    period_end = datetime(
-        designation_date.year + ((period_number + 1) * 2),
-        designation_date.month,
-        designation_date.day
-    ).date() - timedelta(days=1)
 
-    if not user_designation.custom_period_end and period_end > current_date:
-        period_end = current_date
+def _current_year_window(user_designation, today, period):
+    """Return the current calendar year clipped to the (possibly custom) reporting period.
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
+    When the period doesn't reach into the current year the start ends up after the end, so the
+    window matches no records.
+    """
+    year_start, year_end = _calendar_year_period(user_designation, today)
+    return max(year_start, period[0]), min(year_end, period[1])
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
 
-    total_hours = sum(r.hours for r in ce_records)
+def _windows_for(user_designation, today):
+    """Return every date window whose hour totals the designation's requirements need."""
+    period = _period_for(user_designation, today)
+    if period is None:
+        return []
+    if 'yearly_minimum' in DESIGNATION_SPECS[user_designation.designation]:
+        return [period, _current_year_window(user_designation, today, period)]
+    return [period]
 
-    return {
-        'designation': designation_name,
-        'total_required': 30.0,
-        'total_earned': total_hours,
-        'total_remaining': max(0, 30.0 - total_hours),
-        'total_percentage': min(100, max(0, total_hours / 30.0 * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= 30.0,
-        'admin_fee': 250.0,
-        'volunteer_hours_required': 15.0
-    }
 
+# Ethics credit: 'ethics' anywhere in the category or title
+_ETHICS_CLAUSE = or_(CERecord.category.ilike('%ethics%'), CERecord.title.ilike('%ethics%'))
 
-def calculate_cep_requirements(user, user_designation):
-    return _calculate_cepi_requirements(user, user_designation, 'CEP')
 
+def _hours_cache():
+    return g.setdefault('_ce_hours_cache', {})
 
-def calculate_eca_requirements(user, user_designation):
-    return _calculate_cepi_requirements(user, user_designation, 'ECA')
 
+@event.listens_for(Session, 'after_flush')
+@event.listens_for(Session, 'after_commit')
+def _clear_hours_cache(session, *args):
+    # Record writes within the same request/app context must not be hidden by memoized totals
+    if has_app_context():
+        g.pop('_ce_hours_cache', None)
 
-def calculate_cfa_requirements(user, user_designation):
-    """CFA Institute: 20 PL credits per year (calendar year)."""
-    if not user_designation or user_designation.designation != 'CFA':
-        return None
 
-    current_year = datetime.now().year
-    period_start = datetime(current_year, 1, 1).date()
-    period_end = datetime(current_year, 12, 31).date()
+def _load_period_totals(user_id, windows):
+    """Fetch (total hours, ethics hours) for each window in a single query and memoize them."""
+    # Flushing pending record changes first clears any totals they would make stale
+    db.session.flush()
+    cached = _hours_cache()
+    windows = [w for w in dict.fromkeys(windows) if (user_id, *w) not in cached]
+    if not windows:
+        return
+    columns = []
+    for period_start, period_end in windows:
+        in_window = CERecord.date_completed.between(period_start, period_end)
+        columns.append(func.coalesce(func.sum(case((in_window, CERecord.hours), else_=0.0)), 0.0))
+        columns.append(func.coalesce(func.sum(case((and_(in_window, _ETHICS_CLAUSE), CERecord.hours), else_=0.0)), 0.0))
+    row = db.session.query(*columns).filter(
+        CERecord.user_id == user_id,
+        CERecord.date_completed.between(min(w[0] for w in windows), max(w[1] for w in windows))
+    ).one()
+    for i, (period_start, period_end) in enumerate(windows):
+        cached[(user_id, period_start, period_end)] = (row[2 * i], row[2 * i + 1])
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
+def _period_totals(user_id, period_start, period_end):
+    """Return (total hours, ethics hours) for the period, memoized on ``g`` for the request/app context."""
+    _load_period_totals(user_id, [(period_start, period_end)])
+    return _hours_cache()[(user_id, period_start, period_end)]
 
-    total_hours = sum(r.hours for r in ce_records)
-    required = 20.0
 
-    return {
-        'designation': 'CFA',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
+def _progress(earned, required):
+    """Return (hours remaining, percent complete clamped to 0-100); a zero requirement counts as 0%."""
+    remaining = required - earned
+    percentage = earned / required * 100 if required else 0
+    return (
+        remaining if remaining > 0 else 0,
+        100 if percentage >= 100 else (percentage if percentage > 0 else 0),
+    )
 
 
-def calculate_clu_requirements(user, user_designation):
-    """CLU (The American College): 30 hours every 2 years."""
-    if not user_designation or user_designation.designation != 'CLU':
+def _evaluate(user, user_designation, code, today=None):
+    """Build the requirement progress dict for one designation from DESIGNATION_SPECS."""
+    if not user_designation or user_designation.designation != code:
         return None
-
-    current_year = datetime.now().year
-    cycle_start = current_year - 1 if current_year % 2 == 0 else current_year
-    period_start = datetime(cycle_start, 1, 1).date()
-    period_end = datetime(cycle_start + 1, 12, 31).date()
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    total_hours = sum(r.hours for r in ce_records)
-    required = 30.0
-
-    return {
-        'designation': 'CLU',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
-
-
-def calculate_chfc_requirements(user, user_designation):
-    """ChFC (The American College): 30 hours every 2 years."""
-    if not user_designation or user_designation.designation != 'ChFC':
+    today = today or date.today()
+    period = _period_for(user_designation, today)
+    if period is None:
         return None
 
-    current_year = datetime.now().year
-    cycle_start = current_year - 1 if current_year % 2 == 0 else current_year
-    period_start = datetime(cycle_start, 1, 1).date()
-    period_end = datetime(cycle_start + 1, 12, 31).date()
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
+    spec = DESIGNATION_SPECS[code]
+    period_start, period_end = period
+    total_hours, ethics_hours = _period_totals(user.id, period_start, period_end)
+    required = spec['total']
+    remaining, percentage = _progress(total_hours, required)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    total_hours = sum(r.hours for r in ce_records)
-    required = 30.0
-
-    return {
-        'designation': 'ChFC',
+    result = {'designation': code}
+    if spec.get('show_state'):
+        result['state'] = user_designation.state
+    result.update({
         'total_required': required,
         'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
-
-
-def _calculate_iwi_requirements(user, user_designation, designation_name, required_hours=40.0):
-    """Shared logic for Investments & Wealth Institute designations (CIMA, CIMC, CPWA)."""
-    if not user_designation or user_designation.designation != designation_name:
-        return None
-
-    current_year = datetime.now().year
-    cycle_start = current_year - 1 if current_year % 2 == 0 else current_year
-    period_start = datetime(cycle_start, 1, 1).date()
-    period_end = datetime(cycle_start + 1, 12, 31).date()
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    total_hours = sum(r.hours for r in ce_records)
-
-    return {
-        'designation': designation_name,
-        'total_required': required_hours,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required_hours - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required_hours * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required_hours
-    }
+        'total_remaining': remaining,
+        'total_percentage': percentage,
+    })
+    is_complete = total_hours >= required
 
+    if 'yearly_minimum' in spec:
+        minimum = spec['yearly_minimum']
+        current_year_hours = _period_totals(user.id, *_current_year_window(user_designation, today, period))[0]
+        result.update({
+            'yearly_minimum': minimum,
+            'current_year_hours': current_year_hours,
+            'yearly_percentage': _progress(current_year_hours, minimum)[1],
+        })
+        is_complete = is_complete and current_year_hours >= minimum
 
-def calculate_cima_requirements(user, ud):
-    return _calculate_iwi_requirements(user, ud, 'CIMA', 40.0)
+    if 'ethics' in spec:
+        ethics_required = spec['ethics']
+        ethics_remaining, ethics_percentage = _progress(ethics_hours, ethics_required)
+        result.update({
+            'ethics_required': ethics_required,
+            'ethics_earned': min(ethics_hours, ethics_required),
+            'ethics_remaining': ethics_remaining,
+            'ethics_percentage': ethics_percentage,
+        })
+        is_complete = is_complete and ethics_hours >= ethics_required
 
+    result.update({'period_start': period_start, 'period_end': period_end, 'is_complete': is_complete})
+    result.update(spec.get('extra', {}))
+    return result
 
-def calculate_cimc_requirements(user, ud):
-    return _calculate_iwi_requirements(user, ud, 'CIMC', 40.0)
 
+def calculate_cfp_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CFP', today)
 
-def calculate_cpwa_requirements(user, ud):
-    return _calculate_iwi_requirements(user, ud, 'CPWA', 40.0)
 
-
-def calculate_crps_requirements(user, user_designation):
-    """CRPS: 16 hours every 2 years."""
-    if not user_designation or user_designation.designation != 'CRPS':
-        return None
-
-    current_year = datetime.now().year
-    cycle_start = current_year - 1 if current_year % 2 == 0 else current_year
-    period_start = datetime(cycle_start, 1, 1).date()
-    period_end = datetime(cycle_start + 1, 12, 31).date()
-
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
-
-    total_hours = sum(r.hours for r in ce_records)
-    required = 16.0
-
-    return {
-        'designation': 'CRPS',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
+def calculate_cpa_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CPA', today)
 
 
-def calculate_ricp_requirements(user, user_designation):
-    """RICP (The American College): 30 hours every 2 years."""
-    if not user_designation or user_designation.designation != 'RICP':
-        return None
+def calculate_ea_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'EA', today)
 
-    current_year = datetime.now().year
-    cycle_start = current_year - 1 if current_year % 2 == 0 else current_year
-    period_start = datetime(cycle_start, 1, 1).date()
-    period_end = datetime(cycle_start + 1, 12, 31).date()
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
+def calculate_cep_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CEP', today)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
 
-    total_hours = sum(r.hours for r in ce_records)
-    required = 30.0
+def calculate_eca_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'ECA', today)
 
-    return {
-        'designation': 'RICP',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
 
+def calculate_cfa_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CFA', today)
 
-def calculate_cdfa_requirements(user, user_designation):
-    """CDFA: 15 hours per year."""
-    if not user_designation or user_designation.designation != 'CDFA':
-        return None
 
-    current_year = datetime.now().year
-    period_start = datetime(current_year, 1, 1).date()
-    period_end = datetime(current_year, 12, 31).date()
+def calculate_clu_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CLU', today)
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
+def calculate_chfc_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'ChFC', today)
 
-    total_hours = sum(r.hours for r in ce_records)
-    required = 15.0
 
-    return {
-        'designation': 'CDFA',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
+def calculate_cima_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CIMA', today)
 
 
-def calculate_aif_requirements(user, user_designation):
-    """AIF (Fi360): 6 hours per year."""
-    if not user_designation or user_designation.designation != 'AIF':
-        return None
+def calculate_cimc_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CIMC', today)
 
-    current_year = datetime.now().year
-    period_start = datetime(current_year, 1, 1).date()
-    period_end = datetime(current_year, 12, 31).date()
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
+def calculate_cpwa_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CPWA', today)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
 
-    total_hours = sum(r.hours for r in ce_records)
-    required = 6.0
+def calculate_crps_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CRPS', today)
 
-    return {
-        'designation': 'AIF',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required
-    }
 
+def calculate_ricp_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'RICP', today)
 
-def calculate_iar_requirements(user, user_designation):
-    """IAR: 12 hours per year (including 6 ethics/products)."""
-    if not user_designation or user_designation.designation != 'IAR':
-        return None
 
-    current_year = datetime.now().year
-    period_start = datetime(current_year, 1, 1).date()
-    period_end = datetime(current_year, 12, 31).date()
+def calculate_cdfa_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'CDFA', today)
 
-    period_start, period_end = _apply_custom_period(user_designation, period_start, period_end)
 
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= period_start,
-        CERecord.date_completed <= period_end
-    ).all()
+def calculate_aif_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'AIF', today)
 
-    total_hours = sum(r.hours for r in ce_records)
-    ethics_hours = sum(r.hours for r in ce_records if 'ethics' in (r.category or '').lower() or 'ethics' in (r.title or '').lower())
-    required = 12.0
-    ethics_required = 6.0
 
-    return {
-        'designation': 'IAR',
-        'total_required': required,
-        'total_earned': total_hours,
-        'total_remaining': max(0, required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / required * 100)),
-        'ethics_required': ethics_required,
-        'ethics_earned': min(ethics_hours, ethics_required),
-        'ethics_remaining': max(0, ethics_required - ethics_hours),
-        'ethics_percentage': min(100, max(0, ethics_hours / ethics_required * 100)),
-        'period_start': period_start,
-        'period_end': period_end,
-        'is_complete': total_hours >= required and ethics_hours >= ethics_required
-    }
+def calculate_iar_requirements(user, user_designation, today=None):
+    return _evaluate(user, user_designation, 'IAR', today)
 
 
 # Map designation codes to their calculator functions
@@ -516,64 +358,78 @@ DESIGNATION_CALCULATORS = {
 }
 
 
-def calculate_designation_requirements(user, user_designations):
+def calculate_designation_requirements(user, user_designations, today=None):
+    today = today or date.today()
+    # One query computes the hour totals for every designation's windows before the calculators run
+    _load_period_totals(user.id, [w for ud in user_designations for w in _windows_for(ud, today)])
+
     requirements = []
     for ud in user_designations:
         calc = DESIGNATION_CALCULATORS.get(ud.designation)
         if calc:
-            req = calc(user, ud)
+            req = calc(user, ud, today)
             if req:
                 req['is_custom_period'] = bool(ud.custom_period_end)
                 requirements.append(req)
     return requirements
 
 
-def calculate_napfa_requirements(user):
+def _napfa_totals(user_id, cycle_start, cycle_end):
+    """Return (total hours, NAPFA-approved hours, any ethics course) for the cycle, memoized like the period totals."""
+    db.session.flush()
+    cached = _hours_cache()
+    key = ('napfa', user_id, cycle_start, cycle_end)
+    if key not in cached:
+        total, approved, ethics = db.session.query(
+            func.coalesce(func.sum(CERecord.hours), 0.0),
+            func.coalesce(func.sum(case((CERecord.is_napfa_approved, CERecord.hours), else_=0.0)), 0.0),
+            func.coalesce(func.max(case((CERecord.is_ethics_course, 1), else_=0)), 0),
+        ).filter(
+            CERecord.user_id == user_id,
+            CERecord.date_completed.between(cycle_start, cycle_end)
+        ).one()
+        cached[key] = (total, approved, bool(ethics))
+    return cached[key]
+
+
+def calculate_napfa_requirements(user, today=None):
     if not user.is_napfa_member or not user.napfa_join_date:
         return None
 
-    current_year = datetime.now().year
+    current_year = (today or date.today()).year
     if current_year % 2 == 0:
         cycle_start_year = current_year
     else:
         cycle_start_year = current_year - 1
     cycle_end_year = cycle_start_year + 1
 
-    cycle_start = datetime(cycle_start_year, 1, 1).date()
-    cycle_end = datetime(cycle_end_year, 12, 31).date()
+    cycle_start = date(cycle_start_year, 1, 1)
+    cycle_end = date(cycle_end_year, 12, 31)
     join_date = user.napfa_join_date
 
-    if join_date <= datetime(cycle_start_year, 6, 30).date():
-        total_required = 60
-        napfa_approved_required = 30
-    elif join_date <= datetime(cycle_start_year, 12, 31).date():
-        total_required = 45
-        napfa_approved_required = 30
-    elif join_date <= datetime(cycle_end_year, 6, 30).date():
-        total_required = 30
-        napfa_approved_required = 30
-    else:
-        total_required = 15
-        napfa_approved_required = 15
-
-    ce_records = CERecord.query.filter_by(user_id=user.id).filter(
-        CERecord.date_completed >= cycle_start,
-        CERecord.date_completed <= cycle_end
-    ).all()
+    # Members who join partway through the cycle owe prorated hours: (joined on or before, total, NAPFA-approved)
+    thresholds = (
+        (date(cycle_start_year, 6, 30), 60, 30),
+        (date(cycle_start_year, 12, 31), 45, 30),
+        (date(cycle_end_year, 6, 30), 30, 30),
+    )
+    total_required, napfa_approved_required = next(
+        ((total, approved) for cutoff, total, approved in thresholds if join_date <= cutoff), (15, 15)
+    )
 
-    total_hours = sum(r.hours for r in ce_records)
-    napfa_approved_hours = sum(r.hours for r in ce_records if r.is_napfa_approved)
-    ethics_completed = any(r.is_ethics_course for r in ce_records)
+    total_hours, napfa_approved_hours, ethics_completed = _napfa_totals(user.id, cycle_start, cycle_end)
 
+    total_remaining, total_percentage = _progress(total_hours, total_required)
+    napfa_approved_remaining, napfa_approved_percentage = _progress(napfa_approved_hours, napfa_approved_required)
     return {
         'total_required': total_required,
         'total_earned': total_hours,
-        'total_remaining': max(0, total_required - total_hours),
-        'total_percentage': min(100, max(0, total_hours / total_required * 100 if total_required else 0)),
+        'total_remaining': total_remaining,
+        'total_percentage': total_percentage,
         'napfa_approved_required': napfa_approved_required,
         'napfa_approved_earned': napfa_approved_hours,
-        'napfa_approved_remaining': max(0, napfa_approved_required - napfa_approved_hours),
-        'napfa_approved_percentage': min(100, max(0, napfa_approved_hours / napfa_approved_required * 100 if napfa_approved_required else 0)),
+        'napfa_approved_remaining': napfa_approved_remaining,
+        'napfa_approved_percentage': napfa_approved_percentage,
         'ethics_required': True,
         'ethics_completed': ethics_completed,
         'cycle_start': cycle_start,
@@ -582,8 +438,8 @@ def calculate_napfa_requirements(user):
     }
 
 
-# Designation tooltip descriptions (shared across register and manage pages)
-DESIGNATION_REQUIREMENTS = {
+# Designation tooltip descriptions (shared across register and manage pages); read-only since every request shares it
+DESIGNATION_REQUIREMENTS = MappingProxyType({
     'CFP': 'CFP® professionals must complete 30 hours of continuing education (CE) every two years, which includes 2 hours of CFP Board-approved Ethics CE and 28 hours in one or more of the CFP Board\'s Principal Topics.',
     'CFA': 'CFA charterholders must complete 20 professional learning (PL) credits per calendar year through the CFA Institute.',
     'CPA': 'CPAs must complete continuing professional education (CPE) requirements that vary by state. Most states require 40 hours of CPE per year.',
@@ -601,6 +457,13 @@ DESIGNATION_REQUIREMENTS = {
     'IAR': 'Investment Adviser Representatives (IARs) must complete 12 hours of continuing education per year, including 6 hours of ethics/products knowledge.',
     'CEP': 'Certified Equity Professional (CEP) requires 30 hours of continuing education every two years. $250 administrative fee (waived after 15 hours of volunteer work).',
     'ECA': 'Equity Compensation Associate (ECA) requires 30 hours of continuing education every two years. $250 administrative fee (waived after 15 hours of volunteer work).'
-}
+})
+
+ALLOWED_DESIGNATIONS = frozenset({'CFP', 'CFA', 'CPA', 'CLE', 'CLU', 'EA', 'ChFC', 'CIMA', 'CIMC', 'CPWA', 'CRPS', 'RICP', 'CDFA', 'AIF', 'IAR', 'CEP', 'ECA'})
 
-ALLOWED_DESIGNATIONS = ['CFP', 'CFA', 'CPA', 'CLE', 'CLU', 'EA', 'ChFC', 'CIMA', 'CIMC', 'CPWA', 'CRPS', 'RICP', 'CDFA', 'AIF', 'IAR', 'CEP', 'ECA']
+# Valid CPA licensing jurisdictions (50 states + DC), matching the register/manage dropdowns
+US_STATES = frozenset({
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY',
+    'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND',
+    'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA', 'WV', 'WI', 'WY', 'DC',
+})
@@ -10,15 +10,14 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
     is_napfa_member = db.Column(db.Boolean, default=False, nullable=False)
     napfa_join_date = db.Column(db.Date)
     is_admin = db.Column(db.Boolean, default=False, nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
-    reset_token = db.Column(db.String(100), unique=True, nullable=True)
-    reset_token_expiry = db.Column(db.DateTime, nullable=True)
-    ce_records = db.relationship('CERecord', backref='user', lazy=True, cascade='all, delete-orphan')
-    designations = db.relationship('UserDesignation', backref='user', lazy=True, cascade='all, delete-orphan')
+    ce_records = db.relationship('CERecord', back_populates='user', lazy=True, cascade='all, delete-orphan')
+    # Lazy by default; the views and jobs that iterate designations eager-load them explicitly
+    designations = db.relationship('UserDesignation', back_populates='user', lazy=True, cascade='all, delete-orphan')
 
 
 class CERecord(db.Model):
@@ -33,7 +32,24 @@ class CERecord(db.Model):
     is_napfa_approved = db.Column(db.Boolean, default=False, nullable=False)
     is_ethics_course = db.Column(db.Boolean, default=False, nullable=False)
     napfa_subject_area = db.Column(db.String(100))
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+    # Set in Python rather than by the database: the PDF export cache keys on the latest updated_at, and
+    # CURRENT_TIMESTAMP only has one-second resolution on SQLite, so two changes in one second would collide
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc),
+                           onupdate=lambda: datetime.now(timezone.utc))
+
+    user = db.relationship('User', back_populates='ce_records')
+
+    __table_args__ = (
+        # Per-user listings/date-range scans, and the (title, date, hours) duplicate check.
+        # On PostgreSQL the range index also carries the columns the requirement totals read,
+        # so those aggregates are answered by index-only scans.
+        db.Index('ix_cerecord_user_date_covering', 'user_id', 'date_completed',
+                 postgresql_include=['hours', 'category', 'title']),
+        db.Index('ix_cerecord_dup', 'user_id', 'title', 'date_completed', 'hours'),
+        # Dashboard/export category filter and the per-user distinct category list
+        db.Index('ix_cerecord_user_category', 'user_id', 'category'),
+    )
 
 
 class UserDesignation(db.Model):
@@ -44,7 +60,9 @@ class UserDesignation(db.Model):
     state = db.Column(db.String(2))
     last_reminder_sent = db.Column(db.DateTime, nullable=True)
     custom_period_end = db.Column(db.Date, nullable=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+    user = db.relationship('User', back_populates='designations')
 
     __table_args__ = (db.UniqueConstraint('user_id', 'designation', name='unique_user_designation'),)
 
@@ -78,12 +96,23 @@ class PendingCERecord(db.Model):
     raw_extracted_text = db.Column(db.Text, nullable=True)
     extraction_confidence = db.Column(db.String(20), nullable=True)
     error_message = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
     reviewed_at = db.Column(db.DateTime, nullable=True)
 
     user = db.relationship('User', backref=db.backref('pending_records', lazy=True, cascade='all, delete-orphan'))
 
 
+class PasswordReset(db.Model):
+    __tablename__ = 'password_resets'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+    user = db.relationship('User', backref=db.backref('password_resets', lazy=True, cascade='all, delete-orphan'))
+
+
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -92,4 +121,10 @@ class Feedback(db.Model):
     message = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     is_read = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, server_default=db.func.current_timestamp())
+
+    __table_args__ = (
+        # Admin feedback list (newest first) and the per-user cleanup when an account is deleted
+        db.Index('ix_feedback_created_at', 'created_at'),
+        db.Index('ix_feedback_user', 'user_id'),
+    )
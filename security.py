@@ -0,0 +1,27 @@
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug's scrypt defaults for real accounts; one PBKDF2 round under TESTING so fixtures hash instantly
+PRODUCTION_METHOD = 'scrypt:32768:8:1'
+TESTING_METHOD = 'pbkdf2:sha256:1'
+
+
+def _method() -> str:
+    if has_app_context() and current_app.config.get('TESTING'):
+        return TESTING_METHOD
+    return PRODUCTION_METHOD
+
+
+def hash_password(password: str) -> str:
+    """Hash a password with the method configured for the running app."""
+    return generate_password_hash(password, method=_method())
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """Check a password against any hash werkzeug produced, including older PBKDF2 ones."""
+    return check_password_hash(password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when the stored hash was made with a different method or cost than the current one."""
+    return password_hash.split('$', 1)[0] != _method()
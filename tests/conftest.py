@@ -1,27 +1,131 @@
 import pytest
 import os
 import sys
+from datetime import date
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
-from models import db, User, CERecord, UserDesignation, Feedback
+# Must be set before the app module is imported, since the engine is built from it at import time.
+# Flask-SQLAlchemy gives in-memory SQLite a StaticPool with check_same_thread off, so every connection
+# (test client requests, the CLI runner, background threads) shares this one database. Each pytest-xdist
+# worker is a separate process and so gets its own, which lets `pytest -n auto` run without collisions.
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
 
 
-@pytest.fixture(scope='function')
-def test_app():
-    """Create a test application instance."""
+# The app and models are imported inside the fixtures, so collecting tests (or running ones that never
+# touch the app) doesn't pay for wiring up the blueprints, templates and PDF libraries
+@pytest.fixture(scope='session')
+def test_app(tmp_path_factory):
+    """Configure the test application once for the whole run."""
+    from sqlalchemy import event
+    from app import app
+    from models import db
+
     app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
     app.config['WTF_CSRF_ENABLED'] = False
     app.config['SECRET_KEY'] = 'test-secret-key'
+    # Private to this run (and to each pytest-xdist worker), so cached exports never leak between runs
+    app.config['PDF_CACHE_DIR'] = str(tmp_path_factory.mktemp('pdf_cache'))
 
     with app.app_context():
-        db.create_all()
-        yield app
-        db.session.remove()
-        db.drop_all()
+        engine = db.engine
+
+        # pysqlite's own transaction handling breaks SAVEPOINTs; let SQLAlchemy emit BEGIN itself
+        @event.listens_for(engine, 'connect')
+        def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine, 'begin')
+        def _emit_begin(connection):
+            connection.exec_driver_sql('BEGIN')
+
+        # Importing the app already ran init_db() against the in-memory database, so the schema exists.
+        # Reuse that connection (StaticPool keeps just the one) rather than building the schema again.
+        with engine.connect() as connection:
+            connection.connection.dbapi_connection.isolation_level = None
+
+        # Sessions join the per-test transaction through a SAVEPOINT, so commits and rollbacks inside a test
+        # never reach the outer transaction that db_session rolls back
+        db.session.configure(join_transaction_mode='create_savepoint')
+
+    # Nothing to drop afterwards: every test rolls back, and the in-memory database goes away with the process
+    return app
+
+
+@pytest.fixture(autouse=True)
+def db_session(test_app):
+    """Run each test inside one transaction that is rolled back afterwards, instead of rebuilding the schema."""
+    from models import db
+
+    with test_app.app_context():
+        engines = db.engines
+        engine = engines[None]
+        connection = engine.connect()
+        transaction = connection.begin()
+        # Every session (including the ones test client requests open) binds to this connection
+        engines[None] = connection
+        try:
+            yield db.session
+        finally:
+            db.session.remove()
+            transaction.rollback()
+            connection.close()
+            engines[None] = engine
+
+
+@pytest.fixture
+def bulk_create(test_app):
+    """Return a helper that inserts many model objects in batched INSERTs and commits them."""
+    from models import db
+
+    def create(objects):
+        db.session.bulk_save_objects(objects, return_defaults=True)
+        db.session.commit()
+        return objects
+    return create
+
+
+@pytest.fixture
+def record_queries(test_app):
+    """Return a context manager that collects the SQL statements executed inside it into a list."""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    from models import db
+
+    @contextmanager
+    def record():
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        # db.engine is the per-test connection here (see db_session), so only this test's queries are seen
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+    return record
+
+
+@pytest.fixture
+def make_ce_record(test_app):
+    """Return a helper that inserts one CE record for a user and returns its id.
+
+    Title, hours and date get placeholder values unless given. The row goes in through a Core INSERT ...
+    RETURNING, so no ORM instance is built just to read back the primary key.
+    """
+    from sqlalchemy import insert
+    from models import db, CERecord
+
+    def make(user_id, **fields):
+        values = {'title': 'CE Course', 'hours': 1.0, 'date_completed': date(2026, 1, 1), **fields,
+                  'user_id': user_id}
+        record_id = db.session.execute(insert(CERecord).returning(CERecord.id), values).scalar_one()
+        db.session.commit()
+        return record_id
+    return make
 
 
 @pytest.fixture
@@ -39,13 +143,14 @@ def runner(test_app):
 @pytest.fixture
 def sample_user(test_app):
     """Create a sample user for testing."""
-    from werkzeug.security import generate_password_hash
+    from models import db, User
+    from security import hash_password
 
     with test_app.app_context():
         user = User(
             username='testuser',
             email='test@example.com',
-            password_hash=generate_password_hash('password123'),
+            password_hash=hash_password('password123'),
             is_napfa_member=False
         )
         db.session.add(user)
@@ -57,8 +162,10 @@ def sample_user(test_app):
 @pytest.fixture
 def logged_in_client(client, sample_user):
     """Return a client that is already logged in."""
-    client.post('/login', data={
-        'username': sample_user['username'],
-        'password': sample_user['password']
-    })
+    # Write what the login view would put in the session straight into the signed cookie, skipping the
+    # form round-trip and password check; test_auth.py covers the real login flow
+    with client.session_transaction() as sess:
+        sess['user_id'] = sample_user['id']
+        sess['username'] = sample_user['username']
+        sess['show_napfa_tracking'] = False
     return client
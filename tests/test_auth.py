@@ -103,6 +103,19 @@ def test_register_with_cpa_requires_state(client):
     assert b'State is required' in response.data
 
 
+def test_register_with_cpa_rejects_unknown_state(client):
+    response = client.post('/register', data={
+        'username': 'cpauser',
+        'email': 'cpa@example.com',
+        'password': 'password123',
+        'confirm_password': 'password123',
+        'designations': ['CPA'],
+        'cpa_state': 'ZZ',
+        'disclaimer_ack': 'on',
+    }, follow_redirects=True)
+    assert b'Invalid state abbreviation' in response.data
+
+
 def test_login_page_loads(client):
     response = client.get('/login')
     assert response.status_code == 200
@@ -118,6 +131,26 @@ def test_login_success(client, sample_user):
     assert b'Login successful' in response.data
 
 
+def test_login_upgrades_legacy_password_hash(client, sample_user, test_app):
+    from werkzeug.security import generate_password_hash
+    from models import db, User
+    from security import needs_rehash
+    with test_app.app_context():
+        user = db.session.get(User, sample_user['id'])
+        # Any method other than the current one counts as legacy; a low round count keeps the test fast
+        user.password_hash = generate_password_hash(sample_user['password'], method='pbkdf2:sha256:1000')
+        db.session.commit()
+
+    response = client.post('/login', data={
+        'username': sample_user['username'],
+        'password': sample_user['password'],
+    }, follow_redirects=True)
+    assert b'Login successful' in response.data
+
+    with test_app.app_context():
+        assert not needs_rehash(db.session.get(User, sample_user['id']).password_hash)
+
+
 def test_login_wrong_password(client, sample_user):
     response = client.post('/login', data={
         'username': sample_user['username'],
@@ -170,10 +203,13 @@ def test_forgot_password_generates_token(client, sample_user, test_app):
     # Should redirect to the reset page with token
     assert response.status_code == 302
 
-    from models import User as UserModel
+    from models import PasswordReset
     with test_app.app_context():
-        user = UserModel.query.filter_by(email=sample_user['email']).first()
-        assert user.reset_token is not None
+        reset = PasswordReset.query.filter_by(user_id=sample_user['id']).first()
+        assert reset is not None
+        # Only the digest is stored, never the token from the link
+        token = response.headers['Location'].rsplit('/', 1)[-1]
+        assert reset.token_hash != token
 
 
 def test_forgot_password_nonexistent_email(client):
@@ -185,13 +221,9 @@ def test_forgot_password_nonexistent_email(client):
 
 
 def test_reset_password_with_valid_token(client, sample_user, test_app):
-    # Generate token first
-    client.post('/forgot_password', data={'email': sample_user['email']})
-
-    from models import User as UserModel
-    with test_app.app_context():
-        user = UserModel.query.filter_by(email=sample_user['email']).first()
-        token = user.reset_token
+    # Generate token first (no email configured, so we're redirected straight to the reset link)
+    response = client.post('/forgot_password', data={'email': sample_user['email']})
+    token = response.headers['Location'].rsplit('/', 1)[-1]
 
     # Reset password
     response = client.post(f'/reset_password/{token}', data={
@@ -207,7 +239,28 @@ def test_reset_password_with_valid_token(client, sample_user, test_app):
     }, follow_redirects=True)
     assert b'Login successful' in response.data
 
+    # Link is single-use
+    from models import PasswordReset
+    with test_app.app_context():
+        assert PasswordReset.query.filter_by(user_id=sample_user['id']).count() == 0
+
 
 def test_reset_password_invalid_token(client):
     response = client.get('/reset_password/invalidtoken', follow_redirects=True)
     assert b'invalid or has expired' in response.data.lower()
+
+
+def test_reset_password_expired_token(client, sample_user, test_app):
+    from datetime import datetime, timedelta
+    from models import db, PasswordReset
+    from blueprints.auth import _hash_reset_token
+    with test_app.app_context():
+        db.session.add(PasswordReset(
+            user_id=sample_user['id'],
+            token_hash=_hash_reset_token('expiredtoken'),
+            expires_at=datetime.now() - timedelta(days=2),
+        ))
+        db.session.commit()
+
+    response = client.get('/reset_password/expiredtoken', follow_redirects=True)
+    assert b'invalid or has expired' in response.data.lower()
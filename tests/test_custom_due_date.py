@@ -102,6 +102,38 @@ class TestCFPCalculatorWithCustomDate:
             assert result['total_earned'] == 8.0
 
 
+class TestEACalculatorWithCustomDate:
+    """The EA yearly minimum only counts current-year hours inside the reporting period."""
+
+    def test_past_custom_period_has_no_current_year_hours(self, test_app, sample_user):
+        from designation_helpers import calculate_ea_requirements
+        from models import User
+        user = db.session.get(User, sample_user['id'])
+        ud = UserDesignation(user_id=user.id, designation='EA', custom_period_end=date(2024, 12, 31))
+        db.session.add(ud)
+        db.session.add(CERecord(user_id=user.id, title='Tax Update', hours=5.0, date_completed=date(2026, 3, 1)))
+        db.session.commit()
+
+        result = calculate_ea_requirements(user, ud, today=date(2026, 6, 1))
+        assert result['current_year_hours'] == 0
+        assert result['total_earned'] == 0
+
+    def test_current_year_clipped_to_custom_period(self, test_app, sample_user):
+        from designation_helpers import calculate_designation_requirements
+        from models import User
+        user = db.session.get(User, sample_user['id'])
+        ud = UserDesignation(user_id=user.id, designation='EA', custom_period_end=date(2026, 3, 31))
+        db.session.add(ud)
+        db.session.add_all([
+            CERecord(user_id=user.id, title='In period', hours=4.0, date_completed=date(2026, 2, 1)),
+            CERecord(user_id=user.id, title='After period', hours=6.0, date_completed=date(2026, 5, 1)),
+        ])
+        db.session.commit()
+
+        [result] = calculate_designation_requirements(user, [ud], today=date(2026, 6, 1))
+        assert result['current_year_hours'] == 4.0
+
+
 class TestSetDueDateRoute:
     """Test the set_due_date POST action."""
 
@@ -148,11 +180,11 @@ class TestSetDueDateRoute:
 
     def test_set_due_date_wrong_user(self, logged_in_client, test_app, sample_user):
         """Cannot set due date for another user's designation."""
-        from werkzeug.security import generate_password_hash
+        from security import hash_password
         with test_app.app_context():
             from models import User
             other = User(username='other', email='other@test.com',
-                         password_hash=generate_password_hash('pass'))
+                         password_hash=hash_password('pass'))
             db.session.add(other)
             db.session.commit()
             ud = UserDesignation(user_id=other.id, designation='AIF')
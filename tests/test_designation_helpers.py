@@ -0,0 +1,162 @@
+"""Tests for the designation and NAPFA requirement calculators."""
+import pytest
+from datetime import date, timedelta
+from dateutil.relativedelta import relativedelta
+from models import db, UserDesignation, CERecord
+
+
+class TestDashboardRequirements:
+    """Dashboard requirement results always reflect the user's current designations."""
+
+    def test_readded_cepi_designation_starts_new_period(self, logged_in_client, test_app, sample_user):
+        from datetime import datetime, time
+        from models import User
+        user = db.session.get(User, sample_user['id'])
+        designated = date.today() - relativedelta(years=3)
+        old = UserDesignation(user_id=user.id, designation='CEP', created_at=datetime.combine(designated, time()))
+        db.session.add(old)
+        db.session.commit()
+        old_start = (designated + relativedelta(years=2)).strftime('%b %d, %Y').encode()
+        assert old_start in logged_in_client.get('/dashboard').data
+
+        db.session.delete(old)
+        db.session.flush()
+        db.session.add(UserDesignation(user_id=user.id, designation='CEP'))
+        db.session.commit()
+        response = logged_in_client.get('/dashboard')
+        assert old_start not in response.data
+        assert f'Reporting Period: {date.today():%b %d, %Y}'.encode() in response.data
+
+
+class TestBatchedRequirements:
+    """calculate_designation_requirements fetches records once for all designations."""
+
+    def test_matches_individual_calculators_with_one_query(self, test_app, sample_user, bulk_create, record_queries):
+        from designation_helpers import DESIGNATION_CALCULATORS, calculate_designation_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            today = date.today()
+            bulk_create(
+                [UserDesignation(user_id=user.id, designation=code) for code in ('CPA', 'EA', 'CLU', 'IAR')]
+                + [CERecord(user_id=user.id, title=f'Course {i}', hours=2.0,
+                            category='Ethics' if i % 2 else 'Tax',
+                            date_completed=today - timedelta(days=200 * i))
+                   for i in range(6)]
+            )
+            designations = UserDesignation.query.filter_by(user_id=user.id).all()
+
+            with record_queries() as statements:
+                batched = calculate_designation_requirements(user, designations)
+
+            assert sum('FROM ce_record' in s for s in statements) == 1
+            for req, ud in zip(batched, designations):
+                single = DESIGNATION_CALCULATORS[ud.designation](user, ud)
+                single['is_custom_period'] = False
+                assert req == single
+
+    def test_standalone_calculators_share_period_totals(self, test_app, sample_user, record_queries):
+        from designation_helpers import calculate_clu_requirements, calculate_chfc_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            db.session.add(CERecord(user_id=user.id, title='Estate Planning', hours=3.0, date_completed=date.today()))
+            db.session.commit()
+            clu = UserDesignation(user_id=user.id, designation='CLU')
+            chfc = UserDesignation(user_id=user.id, designation='ChFC')
+
+            with record_queries() as statements:
+                assert calculate_clu_requirements(user, clu)['total_earned'] == 3.0
+                assert calculate_chfc_requirements(user, chfc)['total_earned'] == 3.0
+
+            assert sum('FROM ce_record' in s for s in statements) == 1
+
+    def test_period_totals_refresh_after_write_in_same_context(self, test_app, sample_user):
+        from designation_helpers import calculate_cpa_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            cpa = UserDesignation(user_id=user.id, designation='CPA')
+            assert calculate_cpa_requirements(user, cpa)['total_earned'] == 0
+            db.session.add(CERecord(user_id=user.id, title='Audit Update', hours=5.0, date_completed=date.today()))
+            assert calculate_cpa_requirements(user, cpa)['total_earned'] == 5.0
+
+
+class TestExplicitToday:
+    """Calculators use the caller's date instead of reading the clock themselves."""
+
+    def test_periods_follow_passed_date(self, test_app, sample_user):
+        from designation_helpers import calculate_designation_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            designations = [UserDesignation(user_id=user.id, designation='CPA'),
+                            UserDesignation(user_id=user.id, designation='EA')]
+            cpa, ea = calculate_designation_requirements(user, designations, today=date(2020, 5, 1))
+            assert (cpa['period_start'], cpa['period_end']) == (date(2020, 1, 1), date(2020, 12, 31))
+            assert (ea['period_start'], ea['period_end']) == (date(2019, 1, 1), date(2021, 12, 31))
+
+    def test_period_math_memoized_per_day(self, test_app):
+        from designation_helpers import _cepi_period, _period_for_cepi
+        from datetime import datetime
+        ud = UserDesignation(designation='CEP', created_at=datetime(2019, 3, 15))
+        today = date(2024, 6, 1)
+        first = _cepi_period(ud, today)
+        hits = _period_for_cepi.cache_info().hits
+        assert _cepi_period(ud, today) == first == (date(2023, 3, 15), today)
+        assert _period_for_cepi.cache_info().hits == hits + 1
+
+
+class TestProgress:
+    """Remaining hours and percentages are clamped the same way for every requirement."""
+
+    def test_clamps_and_handles_zero_requirement(self):
+        from designation_helpers import _progress
+        assert _progress(10.0, 40.0) == (30.0, 25.0)
+        assert _progress(50.0, 40.0) == (0, 100)
+        assert _progress(5.0, 0) == (0, 0)
+
+
+class TestNapfaProration:
+    """NAPFA requirements are prorated by when the member joined within the two-year cycle."""
+
+    @pytest.mark.parametrize('join_date, expected', [
+        (date(2023, 1, 1), (60, 30)),
+        (date(2024, 6, 30), (60, 30)),
+        (date(2024, 7, 1), (45, 30)),
+        (date(2025, 6, 30), (30, 30)),
+        (date(2025, 7, 1), (15, 15)),
+    ])
+    def test_required_hours_by_join_date(self, test_app, sample_user, join_date, expected):
+        from designation_helpers import calculate_napfa_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            user.is_napfa_member = True
+            user.napfa_join_date = join_date
+            result = calculate_napfa_requirements(user, today=date(2025, 3, 1))
+            assert (result['total_required'], result['napfa_approved_required']) == expected
+
+    def test_totals_aggregated_in_one_query(self, test_app, sample_user, bulk_create, record_queries):
+        from designation_helpers import calculate_napfa_requirements
+        from models import User
+        with test_app.app_context():
+            user = db.session.get(User, sample_user['id'])
+            user.is_napfa_member = True
+            user.napfa_join_date = date(2020, 1, 1)
+            bulk_create([
+                CERecord(user_id=user.id, title='Approved', hours=4.0, date_completed=date(2024, 3, 1),
+                         is_napfa_approved=True),
+                CERecord(user_id=user.id, title='Ethics', hours=2.5, date_completed=date(2025, 2, 1),
+                         is_ethics_course=True),
+                CERecord(user_id=user.id, title='Last cycle', hours=9.0, date_completed=date(2023, 12, 31),
+                         is_napfa_approved=True),
+            ])
+
+            with record_queries() as statements:
+                result = calculate_napfa_requirements(user, today=date(2025, 3, 1))
+                calculate_napfa_requirements(user, today=date(2025, 3, 1))
+
+            assert sum('FROM ce_record' in s for s in statements) == 1
+            assert (result['total_earned'], result['napfa_approved_earned']) == (6.5, 4.0)
+            assert result['ethics_completed'] is True
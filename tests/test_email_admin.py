@@ -8,14 +8,14 @@ ADMIN_KEY = 'cetracker2025admin'
 
 def _create_admin_user(test_app):
     """Create an admin user and return their dict."""
-    from werkzeug.security import generate_password_hash
+    from security import hash_password
     from models import db, User
 
     with test_app.app_context():
         admin = User(
             username='admin',
             email='admin@example.com',
-            password_hash=generate_password_hash('admin123'),
+            password_hash=hash_password('admin123'),
             is_admin=True,
         )
         db.session.add(admin)
@@ -25,14 +25,14 @@ def _create_admin_user(test_app):
 
 def _create_regular_user(test_app, username='regularuser', email='regular@example.com'):
     """Create a non-admin user and return their dict."""
-    from werkzeug.security import generate_password_hash
+    from security import hash_password
     from models import db, User
 
     with test_app.app_context():
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash('pass123'),
+            password_hash=hash_password('pass123'),
         )
         db.session.add(user)
         db.session.commit()
@@ -215,6 +215,23 @@ def test_delete_user_removes_user_and_records(client, test_app):
         assert CERecord.query.filter_by(user_id=target['id']).count() == 0
 
 
+def test_delete_user_removes_cached_pdf_exports(client, test_app):
+    """Deleting a user also removes their cached PDF exports."""
+    import os
+
+    admin = _create_admin_user(test_app)
+    target = _create_regular_user(test_app)
+    cache_dir = test_app.config['PDF_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f"{target['id']}-export.pdf")
+    with open(cached, 'wb') as f:
+        f.write(b'%PDF-')
+
+    _login(client, admin['username'], admin['password'])
+    client.post(f'/admin/delete_user/{target["id"]}')
+    assert not os.path.exists(cached)
+
+
 def test_delete_user_prevents_self_deletion(client, test_app):
     """Admin cannot delete their own account."""
     admin = _create_admin_user(test_app)
@@ -33,13 +33,13 @@ def _create_pending_record(test_app, user_id, **overrides):
 
 def _create_other_user(test_app):
     """Create a second user distinct from the sample_user fixture."""
-    from werkzeug.security import generate_password_hash
+    from security import hash_password
 
     with test_app.app_context():
         user = User(
             username='otheruser',
             email='other@example.com',
-            password_hash=generate_password_hash('otherpass123'),
+            password_hash=hash_password('otherpass123'),
         )
         db.session.add(user)
         db.session.commit()
@@ -93,7 +93,7 @@ def test_approve_pending_record(logged_in_client, test_app, sample_user):
         assert pending.status == 'approved'
         assert pending.reviewed_at is not None
 
-        ce = CERecord.query.filter_by(title='Approved Course').first()
+        ce = CERecord.query.filter_by(user_id=sample_user['id'], title='Approved Course').first()
         assert ce is not None
         assert ce.hours == 3.0
         assert ce.provider == 'AICPA'
@@ -1,7 +1,9 @@
 """Smoke tests for all routes - verify pages load and auth guards work."""
 from datetime import date
 import io
-import json
+
+import orjson
+import pytest
 
 
 def test_index_redirects(client):
@@ -20,7 +22,7 @@ def test_add_ce_page_loads(logged_in_client):
     assert response.status_code == 200
 
 
-def test_add_ce_creates_record(logged_in_client, test_app):
+def test_add_ce_creates_record(logged_in_client, test_app, sample_user):
     response = logged_in_client.post('/add_ce', data={
         'title': 'Test CE Course',
         'provider': 'Test Provider',
@@ -33,41 +35,20 @@ def test_add_ce_creates_record(logged_in_client, test_app):
 
     from models import CERecord
     with test_app.app_context():
-        record = CERecord.query.filter_by(title='Test CE Course').first()
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='Test CE Course').first()
         assert record is not None
         assert record.hours == 2.0
 
 
-def test_delete_ce_record(logged_in_client, test_app, sample_user):
-    # Create a record first
-    from models import CERecord, db
-    with test_app.app_context():
-        record = CERecord(
-            user_id=sample_user['id'],
-            title='To Delete',
-            hours=1.0,
-            date_completed=date(2026, 1, 1),
-        )
-        db.session.add(record)
-        db.session.commit()
-        record_id = record.id
+def test_delete_ce_record(logged_in_client, sample_user, make_ce_record):
+    record_id = make_ce_record(sample_user['id'], title='To Delete')
 
     response = logged_in_client.post(f'/delete_ce/{record_id}', follow_redirects=True)
     assert b'deleted successfully' in response.data
 
 
-def test_edit_ce_record(logged_in_client, test_app, sample_user):
-    from models import CERecord, db
-    with test_app.app_context():
-        record = CERecord(
-            user_id=sample_user['id'],
-            title='Original Title',
-            hours=1.0,
-            date_completed=date(2026, 1, 1),
-        )
-        db.session.add(record)
-        db.session.commit()
-        record_id = record.id
+def test_edit_ce_record(logged_in_client, sample_user, make_ce_record):
+    record_id = make_ce_record(sample_user['id'], title='Original Title')
 
     response = logged_in_client.post(f'/edit_ce/{record_id}', data={
         'title': 'Updated Title',
@@ -80,18 +61,8 @@ def test_edit_ce_record(logged_in_client, test_app, sample_user):
     assert b'updated successfully' in response.data
 
 
-def test_export_csv(logged_in_client, test_app, sample_user):
-    from models import CERecord, db
-    with test_app.app_context():
-        record = CERecord(
-            user_id=sample_user['id'],
-            title='Export Test',
-            hours=2.0,
-            date_completed=date(2026, 1, 1),
-            category='Ethics',
-        )
-        db.session.add(record)
-        db.session.commit()
+def test_export_csv(logged_in_client, sample_user, make_ce_record):
+    make_ce_record(sample_user['id'], title='Export Test', hours=2.0, category='Ethics')
 
     response = logged_in_client.get('/export_ce')
     assert response.status_code == 200
@@ -99,6 +70,24 @@ def test_export_csv(logged_in_client, test_app, sample_user):
     assert b'Export Test' in response.data
 
 
+def test_export_csv_streams_in_chunks(logged_in_client, test_app, sample_user, bulk_create):
+    from blueprints.ce_records import EXPORT_CHUNK_ROWS
+    from models import CERecord
+    row_count = EXPORT_CHUNK_ROWS * 2 + 7
+    with test_app.app_context():
+        bulk_create([
+            CERecord(user_id=sample_user['id'], title=f'Course {i}', hours=1.0, date_completed=date(2026, 1, 1))
+            for i in range(row_count)
+        ])
+
+    response = logged_in_client.get('/export_ce')
+    assert response.is_streamed
+    chunks = list(response.response)
+    # Header, then one chunk per batch of rows
+    assert len(chunks) == 1 + 3
+    assert b''.join(chunks).decode().count('\n') == row_count + 1
+
+
 def test_export_csv_with_filter(logged_in_client, test_app, sample_user):
     response = logged_in_client.get('/export_ce?category=Ethics')
     assert response.status_code == 200
@@ -117,11 +106,48 @@ def test_add_designation(logged_in_client):
     assert b'added successfully' in response.data
 
 
+def test_cannot_remove_other_users_designation(logged_in_client, test_app):
+    from models import User, UserDesignation, db
+    from security import hash_password
+
+    with test_app.app_context():
+        other_user = User(username='otheruser', email='other@example.com',
+                          password_hash=hash_password('password123'))
+        db.session.add(other_user)
+        db.session.commit()
+        ud = UserDesignation(user_id=other_user.id, designation='EA')
+        db.session.add(ud)
+        db.session.commit()
+        ud_id = ud.id
+
+    response = logged_in_client.post('/manage_designations', data={
+        'action': 'remove',
+        'designation_id': ud_id,
+    })
+    assert response.status_code == 404
+
+    with test_app.app_context():
+        assert db.session.get(UserDesignation, ud_id) is not None
+
+
 def test_profile_page_loads(logged_in_client):
     response = logged_in_client.get('/profile')
     assert response.status_code == 200
 
 
+def test_profile_counts_designations_without_loading_them(logged_in_client, sample_user, record_queries):
+    from models import db, UserDesignation
+    db.session.add(UserDesignation(user_id=sample_user['id'], designation='CFA'))
+    db.session.commit()
+
+    with record_queries() as statements:
+        response = logged_in_client.get('/profile')
+    assert response.status_code == 200
+    designation_queries = [s for s in statements if 'FROM user_designation' in s]
+    assert len(designation_queries) == 1
+    assert 'count(' in designation_queries[0]
+
+
 def test_update_email(logged_in_client):
     response = logged_in_client.post('/profile', data={
         'action': 'update_email',
@@ -130,6 +156,24 @@ def test_update_email(logged_in_client):
     assert b'Email updated' in response.data
 
 
+def test_update_email_already_in_use(logged_in_client, test_app, sample_user):
+    from models import User, db
+    from security import hash_password
+    with test_app.app_context():
+        db.session.add(User(username='otheruser', email='taken@example.com',
+                            password_hash=hash_password('password123')))
+        db.session.commit()
+
+    response = logged_in_client.post('/profile', data={
+        'action': 'update_email',
+        'email': 'taken@example.com',
+    }, follow_redirects=True)
+    assert b'already in use' in response.data
+
+    with test_app.app_context():
+        assert db.session.get(User, sample_user['id']).email != 'taken@example.com'
+
+
 def test_change_password(logged_in_client, sample_user):
     response = logged_in_client.post('/profile', data={
         'action': 'change_password',
@@ -140,6 +184,32 @@ def test_change_password(logged_in_client, sample_user):
     assert b'Password changed' in response.data
 
 
+def test_change_password_wrong_current_password(logged_in_client, test_app, sample_user):
+    from models import User, db
+    response = logged_in_client.post('/profile', data={
+        'action': 'change_password',
+        'current_password': 'not-my-password',
+        'new_password': 'newpass123',
+        'confirm_password': 'newpass123',
+    }, follow_redirects=True)
+    assert b'Current password is incorrect' in response.data
+
+    with test_app.app_context():
+        from security import verify_password
+        user = db.session.get(User, sample_user['id'])
+        assert verify_password(user.password_hash, sample_user['password'])
+
+
+def test_change_password_blank_current_password(logged_in_client):
+    response = logged_in_client.post('/profile', data={
+        'action': 'change_password',
+        'current_password': '',
+        'new_password': 'newpass123',
+        'confirm_password': 'newpass123',
+    }, follow_redirects=True)
+    assert b'Current password is required' in response.data
+
+
 def test_submit_feedback(logged_in_client):
     response = logged_in_client.post('/submit_feedback', data={
         'feedback_name': 'Test User',
@@ -150,6 +220,41 @@ def test_submit_feedback(logged_in_client):
     assert b'Thank you for your feedback' in response.data
 
 
+def test_submit_feedback_saved(logged_in_client, test_app, sample_user):
+    logged_in_client.post('/submit_feedback', data={
+        'feedback_name': 'Test User',
+        'feedback_email': 'test@example.com',
+        'feedback_type': 'bug',
+        'feedback_message': 'Saved before the response is sent.',
+    })
+
+    from models import Feedback
+    feedback = Feedback.query.one()
+    assert feedback.message == 'Saved before the response is sent.'
+    assert feedback.user_id == sample_user['id']
+
+
+def test_submit_feedback_reports_failed_save(logged_in_client, monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from models import Feedback, db
+
+    def fail():
+        raise OperationalError('INSERT INTO feedback', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(db.session, 'commit', fail)
+    response = logged_in_client.post('/submit_feedback', data={
+        'feedback_name': 'Test User',
+        'feedback_email': 'test@example.com',
+        'feedback_type': 'bug',
+        'feedback_message': 'This one will not be saved.',
+    }, follow_redirects=True)
+    monkeypatch.undo()
+
+    assert b'could not be saved' in response.data
+    assert b'Thank you for your feedback' not in response.data
+    assert Feedback.query.count() == 0
+
+
 def test_admin_feedback_requires_key(client):
     response = client.get('/admin/feedback', follow_redirects=True)
     assert b'Unauthorized' in response.data
@@ -160,31 +265,26 @@ def test_admin_feedback_with_key(client):
     assert response.status_code == 200
 
 
-def test_cannot_delete_other_users_record(logged_in_client, test_app):
+def test_cannot_delete_other_users_record(logged_in_client, test_app, make_ce_record):
     from models import User, CERecord, db
-    from werkzeug.security import generate_password_hash
+    from security import hash_password
 
     with test_app.app_context():
         other_user = User(
             username='otheruser',
             email='other@example.com',
-            password_hash=generate_password_hash('password123'),
+            password_hash=hash_password('password123'),
         )
         db.session.add(other_user)
-        db.session.commit()
+        # Flush for the id; make_ce_record's commit then saves the user and the record together
+        db.session.flush()
+        record_id = make_ce_record(other_user.id, title='Other Record')
 
-        record = CERecord(
-            user_id=other_user.id,
-            title='Other Record',
-            hours=1.0,
-            date_completed=date(2026, 1, 1),
-        )
-        db.session.add(record)
-        db.session.commit()
-        record_id = record.id
+    response = logged_in_client.post(f'/delete_ce/{record_id}')
+    assert response.status_code == 404
 
-    response = logged_in_client.post(f'/delete_ce/{record_id}', follow_redirects=True)
-    assert b'permission' in response.data.lower()
+    with test_app.app_context():
+        assert db.session.get(CERecord, record_id) is not None
 
 
 # ── CSV Import Tests ──────────────────────────────────────────────────────────
@@ -243,7 +343,7 @@ def _import_csv_with_preview(client, csv_content, confirm=True):
 
     # Post confirmed rows
     confirm_response = client.post('/import_ce', data={
-        'confirmed_rows': json.dumps(rows),
+        'confirmed_rows': orjson.dumps(rows).decode(),
     }, follow_redirects=True)
 
     return confirm_response
@@ -284,7 +384,7 @@ def test_import_valid_csv(logged_in_client, test_app):
         assert tax.hours == 4.5
 
 
-def test_import_flexible_column_names(logged_in_client, test_app):
+def test_import_flexible_column_names(logged_in_client, test_app, sample_user):
     """Import recognizes alternate column names (Course Name, Credits, etc.)."""
     csv_content = (
         "Course Name,Credits,Sponsor,Type\n"
@@ -296,48 +396,30 @@ def test_import_flexible_column_names(logged_in_client, test_app):
 
     from models import CERecord
     with test_app.app_context():
-        record = CERecord.query.filter_by(title='Retirement Planning').first()
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='Retirement Planning').first()
         assert record is not None
         assert record.hours == 3.0
         assert record.provider == 'NAPFA'
         assert record.category == 'Financial Planning'
 
 
-def test_import_missing_required_columns(logged_in_client):
-    """CSV without Title or Hours column is rejected."""
-    csv_content = "Date,Provider,Category\n2026-01-01,AICPA,Ethics\n"
-    csv_data = _make_csv(csv_content)
-    response = logged_in_client.post('/import_ce', data={
-        'csv_file': (csv_data, 'import.csv'),
-    }, content_type='multipart/form-data', follow_redirects=True)
-
-    assert b'must have at least' in response.data.lower()
-
-
-def test_import_missing_title_column_only(logged_in_client):
-    """CSV with Hours but no Title column is rejected."""
-    csv_content = "Hours,Provider\n2.0,AICPA\n"
-    csv_data = _make_csv(csv_content)
+@pytest.mark.parametrize('csv_content', [
+    "Date,Provider,Category\n2026-01-01,AICPA,Ethics\n",
+    "Hours,Provider\n2.0,AICPA\n",
+], ids=['no_title_or_hours', 'no_title'])
+def test_import_missing_required_columns(logged_in_client, csv_content):
+    """CSV without a Title column (with or without Hours) is rejected."""
     response = logged_in_client.post('/import_ce', data={
-        'csv_file': (csv_data, 'import.csv'),
+        'csv_file': (_make_csv(csv_content), 'import.csv'),
     }, content_type='multipart/form-data', follow_redirects=True)
 
     assert b'must have at least' in response.data.lower()
 
 
-def test_import_skips_duplicates(logged_in_client, test_app, sample_user):
+def test_import_skips_duplicates(logged_in_client, test_app, sample_user, make_ce_record):
     """Rows matching an existing record (title + date + hours) are skipped."""
-    from models import CERecord, db
-    with test_app.app_context():
-        existing = CERecord(
-            user_id=sample_user['id'],
-            title='Already Exists',
-            hours=2.0,
-            date_completed=date(2026, 1, 15),
-            description='',
-        )
-        db.session.add(existing)
-        db.session.commit()
+    make_ce_record(sample_user['id'], title='Already Exists', hours=2.0, date_completed=date(2026, 1, 15),
+                   description='')
 
     csv_content = (
         "Title,Hours,Date Completed\n"
@@ -355,7 +437,7 @@ def test_import_skips_duplicates(logged_in_client, test_app, sample_user):
         assert total == 2  # 1 existing + 1 new
 
 
-def test_import_bad_date_falls_back_to_today(logged_in_client, test_app):
+def test_import_bad_date_falls_back_to_today(logged_in_client, test_app, sample_user):
     """Unparseable dates fall back to today with a warning shown in preview."""
     csv_content = (
         "Title,Hours,Date Completed\n"
@@ -376,7 +458,7 @@ def test_import_bad_date_falls_back_to_today(logged_in_client, test_app):
     from models import CERecord
     from datetime import date as dt_date
     with test_app.app_context():
-        record = CERecord.query.filter_by(title='Bad Date Course 2').first()
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='Bad Date Course 2').first()
         assert record is not None
         assert record.date_completed == dt_date.today()
 
@@ -420,6 +502,23 @@ def test_import_skips_blank_rows(logged_in_client, test_app):
         assert CERecord.query.count() == 2
 
 
+def test_import_short_rows(logged_in_client, test_app, sample_user):
+    """Rows with fewer cells than the header treat the missing columns as blank."""
+    csv_content = (
+        "Title,Hours,Provider,Description\n"
+        "Short Row,1.0\n"
+    )
+    response = _import_csv_with_preview(logged_in_client, csv_content)
+
+    assert b'Successfully imported 1 CE record' in response.data
+
+    from models import CERecord
+    with test_app.app_context():
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='Short Row').first()
+        assert record is not None
+        assert record.provider == ''
+
+
 def test_import_row_missing_title(logged_in_client, test_app):
     """A row with hours but no title is skipped with an error note."""
     csv_content = (
@@ -488,6 +587,16 @@ def test_import_empty_csv(logged_in_client):
     assert b'No valid rows found' in response.data
 
 
+def test_import_non_utf8_csv(logged_in_client):
+    """A CSV that isn't valid UTF-8 is rejected with a friendly message."""
+    csv_data = io.BytesIO(b'Title,Hours\nCaf\xe9 Course,1.0\n')
+    response = logged_in_client.post('/import_ce', data={
+        'csv_file': (csv_data, 'import.csv'),
+    }, content_type='multipart/form-data', follow_redirects=True)
+
+    assert b'UTF-8 encoded CSV' in response.data
+
+
 # ── JSON Backup Export Tests ──────────────────────────────────────────────────
 
 
@@ -507,14 +616,14 @@ def test_export_backup_returns_json(logged_in_client):
     assert 'ce_tracker_backup_' in response.headers['Content-Disposition']
     assert response.headers['Content-Disposition'].endswith('.json')
 
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
     assert 'exported_at' in data
 
 
 def test_export_backup_contains_user_info(logged_in_client, sample_user):
     """Backup JSON includes correct user details."""
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert 'user' in data
     assert data['user']['username'] == sample_user['username']
@@ -535,7 +644,7 @@ def test_export_backup_contains_designations(logged_in_client, test_app, sample_
         db.session.commit()
 
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert 'designations' in data
     assert len(data['designations']) == 1
@@ -544,27 +653,23 @@ def test_export_backup_contains_designations(logged_in_client, test_app, sample_
     assert data['designations'][0]['state'] is None
 
 
-def test_export_backup_contains_ce_records(logged_in_client, test_app, sample_user):
+def test_export_backup_contains_ce_records(logged_in_client, sample_user, make_ce_record):
     """Backup JSON includes CE records with all expected fields."""
-    from models import CERecord, db
-    with test_app.app_context():
-        record = CERecord(
-            user_id=sample_user['id'],
-            title='Ethics Annual',
-            provider='AICPA',
-            hours=2.0,
-            date_completed=date(2026, 1, 15),
-            category='Ethics',
-            description='Annual ethics refresher',
-            is_napfa_approved=True,
-            is_ethics_course=True,
-            napfa_subject_area='Ethics',
-        )
-        db.session.add(record)
-        db.session.commit()
+    make_ce_record(
+        sample_user['id'],
+        title='Ethics Annual',
+        provider='AICPA',
+        hours=2.0,
+        date_completed=date(2026, 1, 15),
+        category='Ethics',
+        description='Annual ethics refresher',
+        is_napfa_approved=True,
+        is_ethics_course=True,
+        napfa_subject_area='Ethics',
+    )
 
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert 'ce_records' in data
     assert len(data['ce_records']) == 1
@@ -581,25 +686,39 @@ def test_export_backup_contains_ce_records(logged_in_client, test_app, sample_us
     assert rec['napfa_subject_area'] == 'Ethics'
 
 
-def test_export_backup_multiple_records_ordered(logged_in_client, test_app, sample_user):
+def test_export_backup_streams_records_in_chunks(logged_in_client, test_app, sample_user, bulk_create):
+    from blueprints.ce_records import EXPORT_CHUNK_ROWS
+    from models import CERecord
+    row_count = EXPORT_CHUNK_ROWS + 3
+    with test_app.app_context():
+        bulk_create([
+            CERecord(user_id=sample_user['id'], title=f'Course {i}', hours=1.0, date_completed=date(2026, 1, 1))
+            for i in range(row_count)
+        ])
+
+    response = logged_in_client.get('/export_backup')
+    assert response.is_streamed
+    chunks = list(response.response)
+    # User and designations, one chunk per batch of records, then the closing brackets
+    assert len(chunks) == 1 + 2 + 1
+    assert len(orjson.loads(b''.join(chunks))['ce_records']) == row_count
+
+
+def test_export_backup_multiple_records_ordered(logged_in_client, test_app, sample_user, bulk_create):
     """Backup exports multiple CE records in descending date order."""
-    from models import CERecord, db
+    from models import CERecord
     with test_app.app_context():
-        for i, (title, d) in enumerate([
-            ('Oldest', date(2025, 6, 1)),
-            ('Middle', date(2026, 1, 15)),
-            ('Newest', date(2026, 3, 1)),
-        ]):
-            db.session.add(CERecord(
-                user_id=sample_user['id'],
-                title=title,
-                hours=1.0 + i,
-                date_completed=d,
-            ))
-        db.session.commit()
+        bulk_create([
+            CERecord(user_id=sample_user['id'], title=title, hours=1.0 + i, date_completed=d)
+            for i, (title, d) in enumerate([
+                ('Oldest', date(2025, 6, 1)),
+                ('Middle', date(2026, 1, 15)),
+                ('Newest', date(2026, 3, 1)),
+            ])
+        ])
 
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert len(data['ce_records']) == 3
     # Should be descending by date: Newest, Middle, Oldest
@@ -618,7 +737,7 @@ def test_export_backup_napfa_member(logged_in_client, test_app, sample_user):
         db.session.commit()
 
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert data['user']['is_napfa_member'] is True
     assert data['user']['napfa_join_date'] == '2024-05-01'
@@ -627,7 +746,7 @@ def test_export_backup_napfa_member(logged_in_client, test_app, sample_user):
 def test_export_backup_empty_records(logged_in_client):
     """Backup works when user has no CE records or designations."""
     response = logged_in_client.get('/export_backup')
-    data = json.loads(response.data)
+    data = orjson.loads(response.data)
 
     assert data['ce_records'] == []
     assert data['designations'] == []
@@ -656,7 +775,7 @@ def test_export_import_round_trip(logged_in_client, test_app, sample_user):
     # Export
     export_resp = logged_in_client.get('/export_backup')
     assert export_resp.status_code == 200
-    backup_data = json.loads(export_resp.data)
+    backup_data = orjson.loads(export_resp.data)
 
     # Delete existing record
     with test_app.app_context():
@@ -665,7 +784,7 @@ def test_export_import_round_trip(logged_in_client, test_app, sample_user):
         assert CERecord.query.filter_by(user_id=sample_user['id']).count() == 0
 
     # Re-import the exported data
-    backup_file = io.BytesIO(json.dumps(backup_data).encode('utf-8'))
+    backup_file = io.BytesIO(orjson.dumps(backup_data))
     import_resp = logged_in_client.post('/import_backup', data={
         'backup_file': (backup_file, 'backup.json'),
     }, content_type='multipart/form-data', follow_redirects=True)
@@ -690,11 +809,21 @@ def test_export_import_round_trip(logged_in_client, test_app, sample_user):
 
 def _make_backup_file(data: dict) -> io.BytesIO:
     """Helper: wrap a dict as a JSON BytesIO for upload."""
-    buf = io.BytesIO(json.dumps(data).encode('utf-8'))
+    buf = io.BytesIO(orjson.dumps(data))
     buf.name = 'backup.json'
     return buf
 
 
+def test_import_backup_rejects_oversized_upload(logged_in_client):
+    """Uploads over the import limit are refused before the body is parsed."""
+    big = io.BytesIO(b'{"ce_records": []}' + b' ' * (10 * 1024 * 1024))
+    response = logged_in_client.post('/import_backup', data={
+        'backup_file': (big, 'backup.json'),
+    }, content_type='multipart/form-data', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'too large' in response.data
+
+
 def test_import_backup_requires_login(client):
     """Import backup redirects to login when not authenticated."""
     backup = {'ce_records': []}
@@ -785,19 +914,10 @@ def test_import_backup_rejects_missing_ce_records_key(logged_in_client):
     assert b'ce_records' in response.data
 
 
-def test_import_backup_skips_duplicates(logged_in_client, test_app, sample_user):
+def test_import_backup_skips_duplicates(logged_in_client, test_app, sample_user, make_ce_record):
     """Records matching existing (title + date + hours) are skipped."""
-    from models import CERecord, db
-    with test_app.app_context():
-        existing = CERecord(
-            user_id=sample_user['id'],
-            title='Already Here',
-            hours=2.0,
-            date_completed=date(2026, 1, 15),
-            description='',
-        )
-        db.session.add(existing)
-        db.session.commit()
+    make_ce_record(sample_user['id'], title='Already Here', hours=2.0, date_completed=date(2026, 1, 15),
+                   description='')
 
     backup = {
         'ce_records': [
@@ -817,7 +937,26 @@ def test_import_backup_skips_duplicates(logged_in_client, test_app, sample_user)
         assert CR.query.filter_by(user_id=sample_user['id']).count() == 2
 
 
-def test_import_backup_bad_date_falls_back_to_today(logged_in_client, test_app):
+def test_import_backup_skips_repeats_within_file(logged_in_client, test_app, sample_user):
+    """The same record listed twice in one backup is only restored once."""
+    backup = {
+        'ce_records': [
+            {'title': 'Listed Twice', 'hours': 1.5, 'date_completed': '2026-01-10'},
+            {'title': 'Listed Twice', 'hours': 1.5, 'date_completed': '2026-01-10'},
+        ]
+    }
+    response = logged_in_client.post('/import_backup', data={
+        'backup_file': (_make_backup_file(backup), 'backup.json'),
+    }, content_type='multipart/form-data', follow_redirects=True)
+
+    assert b'Successfully restored 1 CE record' in response.data
+
+    from models import CERecord
+    with test_app.app_context():
+        assert CERecord.query.filter_by(user_id=sample_user['id']).count() == 1
+
+
+def test_import_backup_bad_date_falls_back_to_today(logged_in_client, test_app, sample_user):
     """Records with unparseable dates use today's date with a warning."""
     backup = {
         'ce_records': [
@@ -834,12 +973,12 @@ def test_import_backup_bad_date_falls_back_to_today(logged_in_client, test_app):
     from models import CERecord
     from datetime import date as dt_date
     with test_app.app_context():
-        record = CERecord.query.filter_by(title='Bad Date Course').first()
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='Bad Date Course').first()
         assert record is not None
         assert record.date_completed == dt_date.today()
 
 
-def test_import_backup_missing_date_uses_today(logged_in_client, test_app):
+def test_import_backup_missing_date_uses_today(logged_in_client, test_app, sample_user):
     """Records with no date_completed field default to today."""
     backup = {
         'ce_records': [
@@ -855,7 +994,7 @@ def test_import_backup_missing_date_uses_today(logged_in_client, test_app):
     from models import CERecord
     from datetime import date as dt_date
     with test_app.app_context():
-        record = CERecord.query.filter_by(title='No Date Course').first()
+        record = CERecord.query.filter_by(user_id=sample_user['id'], title='No Date Course').first()
         assert record is not None
         assert record.date_completed == dt_date.today()
 
@@ -991,6 +1130,18 @@ def _create_feedback(test_app):
         return fb.id, fb.is_read
 
 
+def test_admin_feedback_header_counts(client, test_app):
+    """Total and unread counts cover all feedback, whatever filter is applied to the list."""
+    _create_feedback(test_app)
+    read_id, _ = _create_feedback(test_app)
+    client.post(f'/admin/feedback/{read_id}/toggle_read?key={ADMIN_KEY}')
+
+    response = client.get(f'/admin/feedback?key={ADMIN_KEY}&read=read')
+    html = response.data.decode()
+    assert '<div class="admin-stat-value">2</div>' in html
+    assert '<div class="admin-stat-value unread">1</div>' in html
+
+
 def test_admin_toggle_feedback_read(client, test_app):
     """Toggle read flips is_read from False to True."""
     fb_id, initial_read = _create_feedback(test_app)
@@ -1092,20 +1243,10 @@ def test_toggle_napfa_tracking_requires_login(client):
 # ── PDF Export Test ──────────────────────────────────────────────────────────
 
 
-def test_export_pdf(logged_in_client, test_app, sample_user):
+def test_export_pdf(logged_in_client, sample_user, make_ce_record):
     """PDF export returns application/pdf with correct headers."""
-    from models import CERecord, db
-    with test_app.app_context():
-        record = CERecord(
-            user_id=sample_user['id'],
-            title='PDF Export Test',
-            hours=3.0,
-            date_completed=date(2026, 1, 15),
-            category='Tax',
-            description='Test for PDF export',
-        )
-        db.session.add(record)
-        db.session.commit()
+    make_ce_record(sample_user['id'], title='PDF Export Test', hours=3.0, date_completed=date(2026, 1, 15),
+                   category='Tax', description='Test for PDF export')
 
     response = logged_in_client.get('/export_pdf')
     assert response.status_code == 200
@@ -1116,6 +1257,68 @@ def test_export_pdf(logged_in_client, test_app, sample_user):
     assert response.data[:5] == b'%PDF-'
 
 
+def test_export_pdf_served_from_cache_until_records_change(logged_in_client, test_app, sample_user, monkeypatch):
+    """An unchanged report is not re-rendered; adding a record produces a fresh PDF."""
+    from blueprints import ce_records
+    from models import CERecord, db
+    first = logged_in_client.get('/export_pdf').data
+
+    def fail_render(user, filter_category):
+        raise AssertionError('PDF should have come from the cache')
+
+    real_render = ce_records._render_ce_pdf
+    monkeypatch.setattr(ce_records, '_render_ce_pdf', fail_render)
+    assert logged_in_client.get('/export_pdf').data == first
+
+    with test_app.app_context():
+        db.session.add(CERecord(user_id=sample_user['id'], title='Cache Buster', hours=1.0,
+                                date_completed=date(2026, 2, 1)))
+        db.session.commit()
+    monkeypatch.setattr(ce_records, '_render_ce_pdf', real_render)
+    assert logged_in_client.get('/export_pdf').data != first
+
+
+def test_export_pdf_cache_removed_when_record_deleted(logged_in_client, test_app, sample_user, make_ce_record):
+    import os
+    record_id = make_ce_record(sample_user['id'], title='Private Course')
+    logged_in_client.get('/export_pdf')
+    cache_dir = test_app.config['PDF_CACHE_DIR']
+    assert any(name.startswith(f"{sample_user['id']}-") for name in os.listdir(cache_dir))
+
+    logged_in_client.post(f'/delete_ce/{record_id}')
+    assert not any(name.startswith(f"{sample_user['id']}-") for name in os.listdir(cache_dir))
+
+
+def test_export_pdf_cache_expires_stale_files(logged_in_client, test_app):
+    import os
+    import time
+    from blueprints.ce_records import PDF_CACHE_MAX_AGE
+    cache_dir = test_app.config['PDF_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    stale = os.path.join(cache_dir, '999999-stale.pdf')
+    with open(stale, 'wb') as f:
+        f.write(b'%PDF-')
+    past = time.time() - PDF_CACHE_MAX_AGE - 60
+    os.utime(stale, (past, past))
+
+    logged_in_client.get('/export_pdf')
+    assert not os.path.exists(stale)
+
+
+def test_pdf_cache_defaults_to_private_instance_folder(test_app, monkeypatch, tmp_path):
+    import os
+    from blueprints.ce_records import _pdf_cache_dir, _store_cached_pdf
+    monkeypatch.setitem(test_app.config, 'PDF_CACHE_DIR', None)
+    monkeypatch.setattr(test_app, 'instance_path', str(tmp_path))
+    cache_dir = _pdf_cache_dir()
+    assert cache_dir == os.path.join(str(tmp_path), 'pdf_cache')
+
+    path = os.path.join(cache_dir, '1-abc.pdf')
+    _store_cached_pdf(path, b'%PDF-')
+    assert os.stat(cache_dir).st_mode & 0o077 == 0
+    assert os.stat(path).st_mode & 0o077 == 0
+
+
 def test_export_pdf_requires_login(client):
     """PDF export redirects to login when not authenticated."""
     response = client.get('/export_pdf')
@@ -1139,12 +1342,12 @@ def test_analytics_page_loads(logged_in_client):
     assert response.status_code == 200
 
 
-def test_analytics_page_with_data(logged_in_client, test_app, sample_user):
+def test_analytics_page_with_data(logged_in_client, test_app, sample_user, bulk_create):
     """Analytics page loads with CE records present."""
-    from models import CERecord, db
+    from models import CERecord
     with test_app.app_context():
-        for i in range(3):
-            record = CERecord(
+        bulk_create([
+            CERecord(
                 user_id=sample_user['id'],
                 title=f'Analytics Course {i}',
                 hours=2.0,
@@ -1153,11 +1356,14 @@ def test_analytics_page_with_data(logged_in_client, test_app, sample_user):
                 provider='Test Provider',
                 description='',
             )
-            db.session.add(record)
-        db.session.commit()
+            for i in range(3)
+        ])
 
     response = logged_in_client.get('/analytics')
     assert response.status_code == 200
+    assert b'"Tax": 4.0' in response.data
+    assert b'"Ethics": 2.0' in response.data
+    assert b'"2026": 6.0' in response.data
 
 
 def test_analytics_requires_login(client):
@@ -1165,3 +1371,77 @@ def test_analytics_requires_login(client):
     response = client.get('/analytics')
     assert response.status_code == 302
     assert '/login' in response.headers['Location']
+
+
+def test_analytics_monthly_window_covers_last_twelve_months(logged_in_client, test_app, sample_user):
+    """Monthly chart keys are the last 12 calendar months, including the one 11 months back."""
+    from dateutil.relativedelta import relativedelta
+    from models import CERecord, db
+    oldest = date.today().replace(day=1) - relativedelta(months=11)
+    with test_app.app_context():
+        db.session.add(CERecord(
+            user_id=sample_user['id'],
+            title='Old Month Course',
+            hours=3.0,
+            date_completed=oldest,
+        ))
+        db.session.commit()
+
+    response = logged_in_client.get('/analytics')
+    assert response.status_code == 200
+    assert f'"{oldest.strftime("%Y-%m")}": 3.0'.encode() in response.data
+
+
+def test_background_connections_share_test_database(test_app, sample_user):
+    import threading
+    from models import User, db
+    seen = []
+
+    def lookup():
+        with test_app.app_context():
+            seen.append(db.session.get(User, sample_user['id']) is not None)
+
+    worker = threading.Thread(target=lookup)
+    worker.start()
+    worker.join()
+    assert seen == [True]
+
+
+def test_created_at_filled_in_by_database(test_app, sample_user):
+    from datetime import datetime
+    from models import User, PendingCERecord, PasswordReset, db
+    with test_app.app_context():
+        assert db.session.get(User, sample_user['id']).created_at is not None
+
+        pending = PendingCERecord(user_id=sample_user['id'])
+        reset = PasswordReset(user_id=sample_user['id'], token_hash='0' * 64, expires_at=datetime(2030, 1, 1))
+        db.session.add_all([pending, reset])
+        db.session.commit()
+        assert pending.created_at is not None
+        assert reset.created_at is not None
+
+
+def test_bulk_add_ce_inserts_past_sqlite_parameter_limit(test_app, sample_user):
+    from blueprints.ce_records import bulk_add_ce
+    from models import CERecord
+    rows = [
+        {'user_id': sample_user['id'], 'title': f'Course {i}', 'hours': 1.0, 'date_completed': date(2026, 1, 1)}
+        for i in range(1500)
+    ]
+    with test_app.app_context():
+        bulk_add_ce(rows)
+        assert CERecord.query.filter_by(user_id=sample_user['id']).count() == 1500
+
+
+def test_bulk_add_ce_saves_nothing_when_a_row_fails(test_app, sample_user):
+    from sqlalchemy.exc import IntegrityError
+    from blueprints.ce_records import bulk_add_ce
+    from models import CERecord
+    rows = [
+        {'user_id': sample_user['id'], 'title': 'Good', 'hours': 1.0, 'date_completed': date(2026, 1, 1)},
+        {'user_id': sample_user['id'], 'title': None, 'hours': 1.0, 'date_completed': date(2026, 1, 2)},
+    ]
+    with test_app.app_context():
+        with pytest.raises(IntegrityError):
+            bulk_add_ce(rows)
+        assert CERecord.query.filter_by(user_id=sample_user['id']).count() == 0